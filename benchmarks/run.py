@@ -0,0 +1,440 @@
+"""Offline benchmarks for the puck importer.
+
+Runs the import, preprocess, validate, submit, dewar barcode and dewar scan
+stages against synthetic sheets and the in-process database from
+utils.local_db, then compares the timings with stored baselines.
+
+    python -m benchmarks.run --update-baseline   # record baselines
+    python -m benchmarks.run                     # fail on regression
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+from qtpy.QtCore import QCoreApplication, QObject
+
+from benchmarks.startup import entry_points, import_time
+from benchmarks.synthetic import make_puck_sheet, puck_names, write_puck_sheet
+from utils.db_lib import DBConnection
+from utils.local_db import local_references
+from utils.pandas_model import DewarPandasModel, PuckPandasModel
+from utils.puck_lists import (
+    PuckListStore,
+    load_puck_lists,
+    save_puck_lists,
+    wait_for_writes,
+)
+from utils.upload_journal import sheet_hash
+from utils.workers import ImportWorker, UploadWorker
+
+default_baseline = Path(__file__).parent / "baselines.json"
+default_sizes = [16, 1000, 10000, 50000]
+config = {"disable_whitelist": False, "disable_etchedlist": True}
+# Held for the whole run, Python would otherwise collect the application
+_app: Optional[QCoreApplication] = None
+
+
+def init_argparse() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run the puck importer benchmarks")
+    parser.add_argument(
+        "--sizes",
+        type=lambda s: [int(x) for x in s.split(",")],
+        default=default_sizes,
+        help="comma separated sheet sizes in rows",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="seconds of latency injected into every database call",
+    )
+    parser.add_argument("--stages", default=",".join(stages))
+    parser.add_argument("--baseline", type=Path, default=default_baseline)
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store the measured timings as the new baseline",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed slowdown relative to the baseline, 0.25 is 25%%",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="fail when there is no baseline to compare with, for CI",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser
+
+
+def best_of(repeat: int, setup: Callable, run: Callable) -> float:
+    """Fastest of `repeat` runs, setup is excluded from the timing"""
+    timings = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def pucklists(rows: int) -> PuckListStore:
+    return PuckListStore(
+        {
+            "whitelist": puck_names(rows) + puck_names(20000, prefix="OTHER"),
+            "blacklist": puck_names(100, prefix="BAD"),
+            "etched": [],
+        }
+    )
+
+
+def validated_model(rows: int) -> PuckPandasModel:
+    model = PuckPandasModel(make_puck_sheet(rows))
+    model.setPuckLists(pucklists(rows))
+    model.preprocessData()
+    model.validateData(config)
+    return model
+
+
+def bench_import(rows: int, repeat: int, workdir: Path, latency: float) -> float:
+    path = write_puck_sheet(workdir / f"sheet_{rows}.xlsx", rows)
+
+    def setup():
+        worker = ImportWorker(
+            str(path),
+            "openpyxl",
+            pucklists(rows),
+            config,
+            QCoreApplication.instance().thread(),
+        )
+        results: List[tuple] = []
+        worker.finished.connect(lambda *result: results.append(result))
+        return worker, results
+
+    def parse(state):
+        worker, results = state
+        worker.run()
+        model, message = results[0]
+        if model is None or message:
+            raise RuntimeError(f"Import of {path} failed: {message}")
+
+    return best_of(repeat, setup, parse)
+
+
+def bench_preprocess(rows: int, repeat: int, workdir: Path, latency: float) -> float:
+    return best_of(
+        repeat,
+        lambda: PuckPandasModel(make_puck_sheet(rows)),
+        lambda model: model.preprocessData(),
+    )
+
+
+def bench_preprocess_memory(
+    rows: int, repeat: int, workdir: Path, latency: float
+) -> float:
+    """Peak memory allocated while preprocessing, in MiB"""
+    model = PuckPandasModel(make_puck_sheet(rows))
+    tracemalloc.start()
+    try:
+        model.preprocessData()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1 << 20)
+
+
+bench_preprocess_memory.unit = "MiB"
+
+
+def bench_validate(rows: int, repeat: int, workdir: Path, latency: float) -> float:
+    def setup():
+        model = PuckPandasModel(make_puck_sheet(rows))
+        model.setPuckLists(pucklists(rows))
+        model.preprocessData()
+        return model
+
+    return best_of(repeat, setup, lambda model: model.validateData(config))
+
+
+def bench_submit(rows: int, repeat: int, workdir: Path, latency: float) -> float:
+    model = validated_model(rows)
+    records = model._dataframe.to_dict("records")
+
+    def setup():
+        references = local_references(latency)
+        worker = UploadWorker(
+            records,
+            lambda metrics: DBConnection(
+                beamline_id="bench",
+                owner="bench",
+                metrics=metrics,
+                references=references,
+            ),
+            sheet_hash(model._dataframe, "bench", time.time()),
+            journal_dir=workdir / "journal",
+        )
+        errors: List[str] = []
+        worker.error.connect(errors.append)
+        return worker, errors
+
+    def upload(state):
+        worker, errors = state
+        worker.run()
+        if errors:
+            raise RuntimeError(f"Upload failed: {errors[0]}")
+
+    return best_of(repeat, setup, upload)
+
+
+def bench_resubmit(rows: int, repeat: int, workdir: Path, latency: float) -> float:
+    """Resubmission of an uploaded sheet with one edited row in diff mode"""
+    model = validated_model(rows)
+    records = model._dataframe.to_dict("records")
+    edited = [dict(row) for row in records]
+    edited[-1]["samplename"] = f"{edited[-1]['samplename']}_edited"
+
+    def upload(references, rows, diff):
+        worker = UploadWorker(
+            rows,
+            lambda metrics: DBConnection(
+                beamline_id="bench",
+                owner="bench",
+                metrics=metrics,
+                references=references,
+            ),
+            sheet_hash(model._dataframe, "bench", time.time(), diff),
+            journal_dir=workdir / "journal",
+            diff=diff,
+        )
+        errors: List[str] = []
+        worker.error.connect(errors.append)
+        return worker, errors
+
+    def setup():
+        # The first upload runs without latency, only the resubmit is timed
+        references = local_references()
+        worker, errors = upload(references, records, False)
+        worker.run()
+        if errors:
+            raise RuntimeError(f"Upload failed: {errors[0]}")
+        for reference in references.values():
+            reference.latency = latency
+        return upload(references, edited, True)
+
+    def resubmit(state):
+        worker, errors = state
+        worker.run()
+        if errors:
+            raise RuntimeError(f"Resubmit failed: {errors[0]}")
+
+    return best_of(repeat, setup, resubmit)
+
+
+def bench_dewar(rows: int, repeat: int, workdir: Path, latency: float) -> float:
+    """Burst of `rows` barcode load/unload events handled by Dewar"""
+    from utils.devices import Dewar
+
+    names = puck_names(24)
+
+    def setup():
+        references = local_references(latency)
+        db = DBConnection(beamline_id="bench", owner="bench", references=references)
+        references["configuration"].create(
+            key="beamline_info",
+            beamline_id="bench",
+            info_name="primaryDewarName",
+            info={"val": "primaryDewarBench"},
+        )
+        db.container_ref.create(
+            name="primaryDewarBench", owner="bench", kind="dewar", content=[""] * 24
+        )
+        for name in names:
+            db.createContainer(name, 16, "16_pin_puck")
+        # Skip the ophyd/EPICS setup, only the barcode handling is measured
+        dewar = Dewar.__new__(Dewar)
+        dewar.db_connection = db
+        # Unloads are written as they arrive so the burst measures all of them
+        dewar.setupEvents(debounce=0)
+        return dewar
+
+    def burst(dewar):
+        for i in range(rows):
+            position = i % 24
+            obj = SimpleNamespace(
+                parent=SimpleNamespace(
+                    name=f"dewar_sector_{position // 3 + 1}_{'ABC'[position % 3]}"
+                )
+            )
+            barcode = names[position]
+            if (i // 24) % 2:
+                dewar.handle_barcode("", barcode, obj=obj)
+            else:
+                dewar.handle_barcode(barcode, "", obj=obj)
+
+    return best_of(repeat, setup, burst)
+
+
+class ScanWindow(QObject):
+    """Stands in for the dewar scan window, the model moves its cursor"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.tableView = SimpleNamespace(
+            setCurrentIndex=lambda index: setattr(self, "current", index)
+        )
+        self.current = None
+
+
+def bench_dewar_scan(rows: int, repeat: int, workdir: Path, latency: float) -> float:
+    """`rows` puck barcodes scanned into shipping dewars of 10 pucks each"""
+    names = puck_names(rows * 16)
+
+    def setup():
+        window = ScanWindow()
+        return DewarPandasModel(parent=window), window
+
+    def scan(state):
+        model, window = state
+        window.current = model.index(0, 0)
+        for i, name in enumerate(names):
+            if i % 10 == 0:
+                model.setData(window.current, f"DEWAR-{i // 10:05d}", 2)
+            model.setData(window.current, name, 2)
+
+    return best_of(repeat, setup, scan)
+
+
+def write_master_list(rows: int, workdir: Path) -> Path:
+    path = workdir / f"masterlist_{rows}.xlsx"
+    if not path.exists():
+        lists = PuckListStore(
+            {
+                "whitelist": [f"WHITE-{i:05d}" for i in range(rows)],
+                "blacklist": [f"BAD-{i:05d}" for i in range(rows)],
+                "etched": [f"ETCHED-{i:05d}" for i in range(rows)],
+            }
+        )
+        save_puck_lists(path, lists, directory=workdir / "unused_cache").result()
+    return path
+
+
+def bench_lists_cold(rows: int, repeat: int, workdir: Path, latency: float) -> float:
+    """Master list load at startup without a usable snapshot, `rows` pucks per list"""
+    path = write_master_list(rows, workdir)
+
+    def setup():
+        wait_for_writes()
+        return Path(tempfile.mkdtemp(dir=workdir))
+
+    return best_of(repeat, setup, lambda cache: load_puck_lists(path, cache))
+
+
+def bench_lists_cached(rows: int, repeat: int, workdir: Path, latency: float) -> float:
+    """Master list load at startup from an up to date snapshot"""
+    path = write_master_list(rows, workdir)
+    cache = Path(tempfile.mkdtemp(dir=workdir))
+    load_puck_lists(path, cache)
+    wait_for_writes()
+    return best_of(repeat, lambda: cache, lambda cache: load_puck_lists(path, cache))
+
+
+def bench_startup(name: str) -> Callable:
+    def bench(rows: int, repeat: int, workdir: Path, latency: float) -> float:
+        return import_time(entry_points[name], repeat)
+
+    # Startup does not depend on the sheet size, run it once
+    bench.unsized = True
+    return bench
+
+
+stages = {
+    "import": bench_import,
+    "preprocess": bench_preprocess,
+    "preprocess_memory": bench_preprocess_memory,
+    "validate": bench_validate,
+    "submit": bench_submit,
+    "resubmit": bench_resubmit,
+    "dewar": bench_dewar,
+    "dewar_scan": bench_dewar_scan,
+    "lists_cold": bench_lists_cold,
+    "lists_cached": bench_lists_cached,
+    "startup_importer": bench_startup("importer"),
+    "startup_monitor": bench_startup("monitor"),
+}
+
+
+def compare(results, baseline, tolerance) -> List[str]:
+    regressions = []
+    for stage, timings in results.items():
+        for rows, seconds in timings.items():
+            expected = baseline.get(stage, {}).get(rows)
+            if expected is not None and seconds > expected * (1 + tolerance):
+                regressions.append(
+                    f"{stage} with {rows} rows measured {seconds:.4f}, "
+                    f"baseline is {expected:.4f}"
+                )
+    return regressions
+
+
+def main() -> int:
+    args = init_argparse().parse_args()
+    global _app
+    _app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        for stage in args.stages.split(","):
+            try:
+                bench = stages[stage]
+            except KeyError:
+                print(f"Unknown stage {stage}, choose from {', '.join(stages)}")
+                return 2
+            sizes = [0] if getattr(bench, "unsized", False) else args.sizes
+            for rows in sizes:
+                try:
+                    seconds = bench(rows, args.repeat, workdir, args.latency)
+                except (ImportError, subprocess.CalledProcessError) as e:
+                    print(f"Skipping {stage}: {e}")
+                    break
+                results.setdefault(stage, {})[str(rows)] = seconds
+                unit = getattr(bench, "unit", None)
+                if unit is not None:
+                    print(f"{stage:>10} {rows:>6} rows {seconds:10.2f} {unit}")
+                    continue
+                print(
+                    f"{stage:>10} {rows:>6} rows {seconds * 1000:10.2f} ms "
+                    f"{rows / seconds if seconds else 0:12.0f} rows/s"
+                )
+
+    if args.update_baseline:
+        baseline = {}
+        if args.baseline.exists():
+            baseline = json.loads(args.baseline.read_text())
+        for stage, timings in results.items():
+            baseline.setdefault(stage, {}).update(timings)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True))
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --update-baseline first")
+        return 1 if args.check else 0
+    baseline = json.loads(args.baseline.read_text())
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
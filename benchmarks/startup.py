@@ -0,0 +1,65 @@
+"""Import time of the importer and monitor entry points.
+
+Each measurement runs in a fresh interpreter so nothing is already cached
+in sys.modules.
+
+    python -m benchmarks.startup           # wall time of each entry point
+    python -m benchmarks.startup --top 20  # and the slowest modules they import
+"""
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+repo_root = Path(__file__).resolve().parent.parent
+entry_points = {
+    "importer": "import import_pucks",
+    "monitor": "import puck_monitor_service",
+}
+
+
+def import_time(statement: str, repeat: int = 3) -> float:
+    """Fastest wall time of running statement in a new interpreter"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], cwd=repo_root, check=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def slowest_imports(statement: str, top: int) -> List[Tuple[float, str]]:
+    """Modules with the largest cumulative import time, in seconds"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=repo_root,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        # import time:   self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        timings.append((int(cumulative) / 1e6, module.rstrip()))
+    return sorted(timings, reverse=True)[:top]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure entry point import time")
+    parser.add_argument("--top", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    for name, statement in entry_points.items():
+        print(f"{name}: {import_time(statement, args.repeat) * 1000:.0f} ms")
+        for seconds, module in slowest_imports(statement, args.top):
+            print(f"  {seconds * 1000:8.1f} ms {module}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
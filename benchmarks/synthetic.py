@@ -0,0 +1,33 @@
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+
+PUCK_CAPACITY = 16
+
+
+def puck_names(rows: int, prefix: str = "BENCH") -> List[str]:
+    count = (rows + PUCK_CAPACITY - 1) // PUCK_CAPACITY
+    return [f"{prefix}-{i:05d}" for i in range(count)]
+
+
+def make_puck_sheet(rows: int, proposal: int = 123456) -> pd.DataFrame:
+    """A valid puck sheet with `rows` samples packed 16 to a puck, formatted
+    the way users tend to type them (mixed case headers, stray whitespace)"""
+    names = puck_names(rows)
+    return pd.DataFrame(
+        {
+            "PuckName": [f" {names[i // PUCK_CAPACITY]}" for i in range(rows)],
+            "Position": [i % PUCK_CAPACITY + 1 for i in range(rows)],
+            "SampleName": [f"sample_{i:06d} " for i in range(rows)],
+            "Model": ["" if i % 3 else f"model{i % 7}" for i in range(rows)],
+            "Sequence": ["" if i % 2 else "MKV LLA" for i in range(rows)],
+            "ProposalNum": [proposal] * rows,
+            "Notes": ["ignored column"] * rows,
+        }
+    )
+
+
+def write_puck_sheet(path: Path, rows: int) -> Path:
+    make_puck_sheet(rows).to_excel(path, index=False, engine="openpyxl")
+    return path
@@ -1,8 +1,16 @@
 import os
+import sys
+import hashlib
+import pickle
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from config_params import BEAM_CHECK, UNMOUNT_COLD_CHECK
 from math import *
 import math
 import requests
+import requests.adapters
 import getpass
 import logging
 logger = logging.getLogger(__name__)
@@ -15,10 +23,11 @@ beamline = os.environ["BEAMLINE_ID"]
 global beamlineComm #this is the comm_ioc
 beamlineComm = ""
 global searchParams
-global motor_dict,counter_dict,scan_list,soft_motor_list,pvLookupDict
+global motor_dict,counter_dict,scan_list,soft_motor_list,pvLookupDict,pv_name_dict
 global detector_id
 detector_id = ""
 pvLookupDict = {}
+pv_name_dict = {}
 motor_dict = {}
 counter_dict = {}
 scan_list = []
@@ -206,25 +215,72 @@ def getScreenDefaultParams():
     return screenDist, screenEnergy, screenExptime, screenPhiend, screenPhist, screenReso, screenTransmissionPercent, screenWidth, screenbeamHeight, screenbeamWidth
 
 
+# Snapshots are saved in the order they were taken by a single writer. At
+# most xtal_queue_size snapshots wait to be saved, taking more blocks until
+# one is done so a fast omega series cannot pile up unbounded in memory
+xtal_queue_size = 8
+xtal_timeout = 10
+_xtal_session = None
+_xtal_session_lock = threading.Lock()
+_xtal_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="xtal_writer")
+_xtal_slots = threading.BoundedSemaphore(xtal_queue_size)
+
+def getXtalSession():
+  """Session shared by all snapshots so the camera connection is reused"""
+  global _xtal_session
+  with _xtal_session_lock:
+    if _xtal_session is None:
+      _xtal_session = requests.Session()
+      adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=4)
+      _xtal_session.mount("http://", adapter)
+      _xtal_session.mount("https://", adapter)
+    return _xtal_session
+
+def _save_crystal_picture(image, filename, reqID, omega):
+  try:
+    if (filename != None):
+      image.seek(0)
+      with open(filename+".jpg","wb+") as fd:
+        shutil.copyfileobj(image, fd)
+    if (reqID != None):
+      image.seek(0)
+      xtalpicJpegDataResult = {}
+      imgRef = db_lib.addFile(image.read())
+      xtalpicJpegDataResult["data"] = imgRef
+      xtalpicJpegDataResult["omegaPos"] = omega
+      db_lib.addResultforRequest("xtalpicJpeg",reqID,owner=owner,result_obj=xtalpicJpegDataResult,beamline=beamline)
+  except Exception as e:
+    logger.error("Could not save crystal picture %s for request %s: %s" % (filename, reqID, e))
+  finally:
+    image.close()
+    _xtal_slots.release()
+
 def take_crystal_picture(filename=None,czoom=0,reqID=None,omega=-999):
+  """Grab a snapshot now and save it to filename.jpg and/or the request in
+  the background, returns the future of the save"""
   zoom = int(czoom)
   if not (has_xtalview):
     return
   if (zoom==0):
-    r=requests.get(xtal_url)
+    url = xtal_url
   else:
-    r=requests.get(xtal_url_small)
-  data = r.content
-  if (filename != None):
-    fd = open(filename+".jpg","wb+")
-    fd.write(data)
-    fd.close()
-  if (reqID != None):
-    xtalpicJpegDataResult = {}
-    imgRef = db_lib.addFile(data)
-    xtalpicJpegDataResult["data"] = imgRef
-    xtalpicJpegDataResult["omegaPos"] = omega 
-    db_lib.addResultforRequest("xtalpicJpeg",reqID,owner=owner,result_obj=xtalpicJpegDataResult,beamline=beamline)
+    url = xtal_url_small
+  # The image is streamed into a spooled file, kept in memory while small
+  image = tempfile.SpooledTemporaryFile(max_size=4 << 20)
+  try:
+    with getXtalSession().get(url, stream=True, timeout=xtal_timeout) as r:
+      r.raise_for_status()
+      for chunk in r.iter_content(chunk_size=64 << 10):
+        image.write(chunk)
+  except Exception:
+    image.close()
+    raise
+  _xtal_slots.acquire()
+  return _xtal_writer.submit(_save_crystal_picture, image, filename, reqID, omega)
+
+def wait_for_crystal_pictures():
+  """Block until every snapshot taken so far has been saved"""
+  _xtal_writer.submit(lambda: None).result()
 
 
 
@@ -246,9 +302,82 @@ def findOneH5Master(prefix):
   return masterFilename
   
 
+pv_index_version = 1
+pv_index_dir = os.path.expanduser("~/.puckimporter/cache")
+
+def parsePVDesc(dbfile, beamline_designation=None):
+  """Build the motor, soft motor, control PV, scan and counter tables of an
+  EPICS beamline info file in one pass over its lines"""
+  sections = ["motors", "soft_motors", "control", "scans", "counters"]
+  markers = {"#virtual motors": 1, "#control PVs": 2, "#scanned motors": 3, "#counters": 4}
+  index = {"motor_dict": {}, "soft_motor_list": [], "pvLookupDict": {}, "scan_list": [], "counter_dict": {}}
+  section = 0
+  for number, line in enumerate(dbfile):
+    line = line.rstrip("\n")
+    if number < 3:
+      # Header, the second line holds the beamline designation
+      if number == 1:
+        beamline_designation = line
+      continue
+    if line in markers and markers[line] > section:
+      section = markers[line]
+      continue
+    inf = line.split()
+    if not inf:
+      continue
+    kind = sections[section]
+    if kind == "motors":
+      index["motor_dict"][inf[1]] = beamline_designation + inf[0]
+    elif kind == "soft_motors":
+      index["soft_motor_list"].append(beamline_designation + inf[0])
+      index["motor_dict"][inf[1]] = beamline_designation + inf[0]
+    elif kind == "control":
+      index["pvLookupDict"][inf[1]] = beamline_designation + inf[0]
+    elif kind == "scans":
+      index["scan_list"].append(beamline_designation + line + "scanParms")
+    else:
+      index["counter_dict"][inf[1]] = beamline_designation + inf[0]
+  index["beamline_designation"] = beamline_designation
+  # PV to name, for looking names up from PVs
+  index["pv_name_dict"] = {}
+  for table in ("counter_dict", "pvLookupDict", "motor_dict"):
+    index["pv_name_dict"].update({pv: name for name, pv in index[table].items()})
+  return index
+
+def _pvIndexPath(dbfilename):
+  key = hashlib.sha1(os.path.abspath(dbfilename).encode()).hexdigest()[:16]
+  return os.path.join(pv_index_dir, "pvdesc-%s.pickle" % key)
+
+def loadPVIndex(dbfilename):
+  """Parsed tables of dbfilename, read from a pickled index while the file's
+  mtime and size are unchanged and parsed and stored again otherwise"""
+  stat = os.stat(dbfilename)
+  key = (pv_index_version, stat.st_mtime_ns, stat.st_size)
+  index_path = _pvIndexPath(dbfilename)
+  try:
+    with open(index_path, "rb") as f:
+      cached = pickle.load(f)
+    if cached["key"] == key:
+      return cached["index"]
+  except FileNotFoundError:
+    pass
+  except Exception as e:
+    logger.info("Ignoring unreadable PV index %s: %s" % (index_path, e))
+  with open(dbfilename, "r") as dbfile:
+    index = parsePVDesc(dbfile)
+  try:
+    os.makedirs(pv_index_dir, exist_ok=True)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+      pickle.dump({"key": key, "index": index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, index_path)
+  except OSError as e:
+    logger.info("Could not write PV index %s: %s" % (index_path, e))
+  return index
+
 def readPVDesc():
   global beamline_designation,motor_dict,soft_motor_list,scan_list,counter_dict
-  
+
   envname = "EPICS_BEAMLINE_INFO"
   try:
     dbfilename = os.environ[envname]
@@ -260,59 +389,19 @@ def readPVDesc():
     logger.info(error_msg)
     sys.exit()
   else:
-    dbfile = open(dbfilename,'r')
-    line = dbfile.readline()
-    line = dbfile.readline()
-    beamline_designation = line[:-1]
-    line = dbfile.readline()
-    i = 0
-    while(1):
-      line = dbfile.readline()
-      if (line == ""):
-        break
-      else:
-        line = line[:-1]
-        if (line == "#virtual motors"):
-          break
-        else:
-          motor_inf = line.split()
-          motor_dict[motor_inf[1]] = beamline_designation +  motor_inf[0]
-    while(1):
-      line = dbfile.readline()
-      if (line == ""):
-        break
-      else:
-        line = line[:-1]
-        if (line == "#control PVs"):
-          break
-        else:
-          motor_inf = line.split()
-          soft_motor_list.append(beamline_designation + motor_inf[0])
-          motor_dict[motor_inf[1]] = beamline_designation + motor_inf[0]          
-    while(1):
-      line = dbfile.readline()
-      if (line == ""):
-        break
-      else:
-        line = line[:-1]
-        if (line == "#scanned motors"):
-          break
-        else:
-          inf = line.split()
-          pvLookupDict[inf[1]] = beamline_designation + inf[0]          
-    while(1):
-      line = dbfile.readline()
-      if (line == ""):
-        break
-      else:
-        line = line[:-1]
-        if (line == "#counters"):
-          break
-        else:
-          scan_list.append(beamline_designation + line + "scanParms")
-    line = dbfile.readline()
-    counter_inf = line.split()
-    counter_dict[counter_inf[1]] = beamline_designation + counter_inf[0]    
+    index = loadPVIndex(dbfilename)
+    beamline_designation = index["beamline_designation"]
+    # Update in place, other modules may hold references to these tables
+    motor_dict.update(index["motor_dict"])
+    soft_motor_list.extend(index["soft_motor_list"])
+    pvLookupDict.update(index["pvLookupDict"])
+    scan_list.extend(index["scan_list"])
+    counter_dict.update(index["counter_dict"])
+    pv_name_dict.update(index["pv_name_dict"])
+
+def pvName(pv):
+  """Name of a motor, control PV or counter from its PV, None if unknown"""
+  return pv_name_dict.get(pv)
 
 def createVisitNameRaw(proposalName, maxNumber=None):
   if maxNumber:
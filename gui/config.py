@@ -1,7 +1,6 @@
 import json
 from pathlib import Path
 
-import pandas as pd
 from qtpy.QtWidgets import (
     QCheckBox,
     QDialog,
@@ -11,11 +10,13 @@ from qtpy.QtWidgets import (
     QVBoxLayout,
 )
 
+from utils.puck_lists import PuckListStore, save_puck_lists
+
 from .listWidget import ListWidget
 
 
 class ConfigurationWindow(QDialog):
-    def __init__(self, *args, config, puck_list, **kwargs):
+    def __init__(self, *args, config, puck_list: PuckListStore, **kwargs):
         self.config = config
         self.puck_list = puck_list
         super().__init__(*args, **kwargs)
@@ -119,21 +120,7 @@ class ConfigurationWindow(QDialog):
         self.puck_list["blacklist"] = self.blacklistWidget.puck_list
         self.puck_list["etched"] = self.etchedlistWidget.puck_list
         list_path = Path(self.config["list_path"])
-        self.write_to_excel(list_path, self.puck_list)
+        save_puck_lists(list_path, self.puck_list)
 
     def cancelClicked(self):
         self.reject()
-
-    def write_to_excel(self, list_path, puck_list):
-        with pd.ExcelWriter(list_path, engine="auto", mode="w") as writer:
-            for internal_key, external_key in {
-                "etched": "etched",
-                "whitelist": "white_list",
-                "blacklist": "black_list",
-            }.items():
-                # Ensure the list is not empty
-                if not puck_list[internal_key]:
-                    puck_list[internal_key] = [""]  # Placeholder for an empty sheet
-
-                df = pd.DataFrame({external_key: puck_list[internal_key]})
-                df.to_excel(writer, sheet_name=external_key, index=False, header=False)
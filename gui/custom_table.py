@@ -12,14 +12,91 @@ class TableWithCopy(QTableView):
     * supports copying multiple cell's text onto the clipboard
     * formatted specifically to work with multiple-cell paste into programs
       like google sheets, excel, or numbers
+    * sizes columns to their contents shortly after changes settle, measuring
+      the visible rows and a bounded sample of the rest
     """
 
+    # Milliseconds to wait after the last change before resizing columns
+    resize_delay = 100
+    # Rows measured per column besides the visible ones
+    sample_rows = 200
+    # Rows measured from the top when the view has not been laid out yet
+    fallback_rows = 50
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self._sized_model: typing.Optional[QAbstractItemModel] = None
+        # Width each column was last sized to, dropped when its data changes
+        self._column_widths: typing.Dict[int, int] = {}
+        self._resize_timer = QtCore.QTimer(self)
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.setInterval(self.resize_delay)
+        self._resize_timer.timeout.connect(self.autosizeColumns)
 
     def setModel(self, model: QAbstractItemModel) -> None:
+        if self._sized_model is not None:
+            try:
+                self._sized_model.dataChanged.disconnect(self._columnsChanged)
+                self._sized_model.modelReset.disconnect(self.scheduleResize)
+                self._sized_model.columnsInserted.disconnect(self.scheduleResize)
+                self._sized_model.columnsRemoved.disconnect(self.scheduleResize)
+            except (TypeError, RuntimeError):
+                # The previous model is already gone
+                pass
         super().setModel(model)
-        model.dataChanged.connect(self.resizeColumnsToContents)
+        self._sized_model = model
+        model.dataChanged.connect(self._columnsChanged)
+        model.modelReset.connect(self.scheduleResize)
+        model.columnsInserted.connect(self.scheduleResize)
+        model.columnsRemoved.connect(self.scheduleResize)
+        self.scheduleResize()
+
+    def _columnsChanged(
+        self, top_left: QModelIndex, bottom_right: QModelIndex, roles=()
+    ):
+        if roles and Qt.ItemDataRole.DisplayRole not in roles:
+            # Colour changes do not affect the width
+            return
+        for column in range(top_left.column(), bottom_right.column() + 1):
+            self._column_widths.pop(column, None)
+        self._resize_timer.start()
+
+    def scheduleResize(self, *args) -> None:
+        """Size every column again once changes settle"""
+        self._column_widths = {}
+        self._resize_timer.start()
+
+    def _measuredRows(self) -> typing.List[int]:
+        row_count = self.model().rowCount()
+        if row_count == 0:
+            return []
+        first = self.rowAt(0)
+        last = self.rowAt(self.viewport().height() - 1)
+        if first < 0:
+            first = 0
+        if last < 0:
+            last = min(row_count - 1, first + self.fallback_rows)
+        step = max(1, row_count // self.sample_rows)
+        return sorted(set(range(first, last + 1)) | set(range(0, row_count, step)))
+
+    def autosizeColumns(self) -> None:
+        model = self.model()
+        if model is None:
+            return
+        header = self.horizontalHeader()
+        rows = None
+        for column in range(model.columnCount()):
+            if column in self._column_widths:
+                continue
+            if rows is None:
+                rows = self._measuredRows()
+            width = header.sectionSizeHint(column)
+            for row in rows:
+                index = model.index(row, column)
+                width = max(width, self.sizeHintForIndex(index).width())
+            self._column_widths[column] = width
+            if self.columnWidth(column) != width:
+                self.setColumnWidth(column, width)
 
     def rowCount(self):
         return self.model().rowCount()
@@ -50,6 +127,8 @@ class TableWithCopy(QTableView):
             event.modifiers() & Qt.KeyboardModifier.ControlModifier
         ):
             destination_cells = sorted(self.selectedIndexes())
+            if not destination_cells:
+                return
             rows = QApplication.clipboard().text().split("\n")
             if len(rows) > 1:
                 rows = rows[:-1]
@@ -63,16 +142,29 @@ class TableWithCopy(QTableView):
             if len(rows) == 0:
                 return
 
+            top = destination_cells[0].row()
+            left = destination_cells[0].column()
+            selected_rows = destination_cells[-1].row() - top + 1
+            selected_cols = destination_cells[-1].column() - left + 1
+            # Models with setBlock take a whole rectangular selection in one write
+            set_block = getattr(self.model(), "setBlock", None)
+            if len(destination_cells) != selected_rows * selected_cols:
+                set_block = None
+
             if len(rows) == 1 and num_cols == 1:
+                if set_block is not None:
+                    set_block(
+                        top, left, [[rows[0][0]] * selected_cols] * selected_rows
+                    )
+                    return
                 for d in destination_cells:
-                    self.model().setData(d, rows[0], role=Qt.ItemDataRole.EditRole)
+                    self.model().setData(d, rows[0][0], role=Qt.ItemDataRole.EditRole)
                 return
 
-            selected_rows = destination_cells[-1].row() - destination_cells[0].row() + 1
-            selected_cols = (
-                destination_cells[-1].column() - destination_cells[0].column() + 1
-            )
-            if len(rows) != selected_rows or num_cols != selected_cols:
+            if (
+                len(rows) != selected_rows
+                or any(len(row) != selected_cols for row in rows)
+            ):
                 QMessageBox.information(
                     self,
                     "Error",
@@ -81,12 +173,14 @@ class TableWithCopy(QTableView):
                 )
                 return
 
+            if set_block is not None:
+                set_block(top, left, rows)
+                return
+
             for d in destination_cells:
                 self.model().setData(
                     d,
-                    rows[d.row() - destination_cells[0].row()][
-                        d.column() - destination_cells[0].column()
-                    ],
+                    rows[d.row() - top][d.column() - left],
                     role=Qt.ItemDataRole.EditRole,
                 )
 
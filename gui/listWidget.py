@@ -1,4 +1,5 @@
-from typing import List
+import typing
+from typing import Callable, List, Optional
 
 from qtpy.QtWidgets import (
     QLineEdit,
@@ -12,46 +13,146 @@ from qtpy.QtWidgets import (
     QAction,
     QMenu,
 )
-from qtpy.QtGui import QStandardItemModel, QStandardItem
-from qtpy.QtCore import QSortFilterProxyModel, Signal, Qt
+from qtpy.QtCore import QAbstractListModel, QModelIndex, QTimer, Signal, Qt
+
+from utils.puck_lists import PuckList
+
+
+class PuckListModel(QAbstractListModel):
+    """List model reading straight from a PuckList.
+
+    Rows are looked up on demand instead of creating an item per puck. A
+    filter narrows the rows to the names containing a piece of text, it is
+    applied once typing pauses and rescans only the previous result while
+    the text keeps growing.
+    """
+
+    def __init__(
+        self,
+        puck_list: PuckList,
+        check_rename: Callable[[str, str], bool],
+        parent=None,
+    ) -> None:
+        super().__init__(parent)
+        self.puck_list = puck_list
+        self.check_rename = check_rename
+        self.filter_text = ""
+        # Names shown when filtered, None when every name is shown
+        self._rows: Optional[List[str]] = None
+
+    def _names(self) -> List[str]:
+        return self.puck_list.names if self._rows is None else self._rows
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._names())
+
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return self._names()[index.row()]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole:
+            return "Puck Name"
+        return None
+
+    def flags(self, index):
+        return (
+            Qt.ItemFlag.ItemIsSelectable
+            | Qt.ItemFlag.ItemIsEnabled
+            | Qt.ItemFlag.ItemIsEditable
+        )
+
+    def setData(self, index: QModelIndex, value: typing.Any, role: int = ...) -> bool:
+        if role != Qt.ItemDataRole.EditRole or not index.isValid():
+            return False
+        old_name = self._names()[index.row()]
+        new_name = str(value)
+        if new_name == old_name or not self.check_rename(old_name, new_name):
+            return False
+        self.puck_list.rename(old_name, new_name)
+        if self._rows is not None:
+            self._rows[index.row()] = new_name
+        self.dataChanged.emit(index, index)
+        return True
+
+    def setFilter(self, text: str) -> None:
+        if text == self.filter_text:
+            return
+        self.beginResetModel()
+        if not text:
+            self._rows = None
+        else:
+            within = None
+            if self.filter_text and text.startswith(self.filter_text):
+                # Typing more characters only narrows the previous result
+                within = self._rows
+            self._rows = self.puck_list.matching(text, within=within)
+        self.filter_text = text
+        self.endResetModel()
+
+    def appendName(self, name: str) -> None:
+        shown = self._rows is None or self.filter_text in name
+        if shown:
+            row = self.rowCount()
+            self.beginInsertRows(QModelIndex(), row, row)
+        self.puck_list.add(name)
+        if shown:
+            if self._rows is not None:
+                self._rows.append(name)
+            self.endInsertRows()
+
+    def removeRowsAt(self, rows: List[int]) -> List[str]:
+        """Remove the names shown at rows in a single update"""
+        names = self._names()
+        removed = [names[row] for row in rows]
+        self.beginResetModel()
+        self.puck_list.removeMany(removed)
+        if self._rows is not None:
+            removed_set = set(removed)
+            self._rows = [name for name in self._rows if name not in removed_set]
+        self.endResetModel()
+        return removed
 
 
 class ListWidget(QWidget):
     updated_list = Signal(object)
+    # Milliseconds to wait after the last keystroke before filtering
+    filter_delay = 200
 
     def __init__(
-        self, *args, puck_list: "List[str]|None" = None, not_allowed=None, **kwargs
+        self,
+        *args,
+        puck_list: "PuckList | None" = None,
+        not_allowed: "PuckList | None" = None,
+        **kwargs,
     ):
         super().__init__(*args, **kwargs)
-        self.list_model = QStandardItemModel(self)
-        self.list_model.setHorizontalHeaderLabels(["Puck Name"])
-        self.list_model.itemChanged.connect(self.check_item)
-
-        self.proxy_model = QSortFilterProxyModel(self)
-        self.proxy_model.setSourceModel(self.list_model)
-
-        if not not_allowed:
-            not_allowed = []
-        self.not_allowed = set(not_allowed)
-        if not puck_list:
-            puck_list = []
+        self.set_not_allowed_list(not_allowed)
+        if puck_list is None:
+            puck_list = PuckList()
         self.puck_list = puck_list
-
-        for puck_name in self.puck_list:
-            item = QStandardItem(puck_name)
-            item.setData(
-                puck_name, Qt.ItemDataRole.UserRole
-            )  # Setting old name to replace new name if there is a validation error
-            self.list_model.appendRow(item)
+        self.list_model = PuckListModel(self.puck_list, self.check_rename, self)
+        self.list_model.dataChanged.connect(self.renamed)
 
         self.list_view = QListView(self)
-        self.list_view.setModel(self.proxy_model)
+        self.list_view.setModel(self.list_model)
+        self.list_view.setUniformItemSizes(True)
         self.list_view.setSelectionMode(
             QAbstractItemView.SelectionMode.ExtendedSelection
         )
         self.list_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.list_view.customContextMenuRequested.connect(self.open_menu)
 
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(self.filter_delay)
+        self.filter_timer.timeout.connect(self.apply_filter)
+
         self.search_box = QLineEdit(self)
         self.search_box.setPlaceholderText("Filter pucks...")
         self.search_box.textChanged.connect(self.filter_pucks)
@@ -69,7 +170,6 @@ class ListWidget(QWidget):
         vert_layout.addWidget(self.list_view)
 
         self.setLayout(vert_layout)
-        self.resetting_name = False
 
     def open_menu(self, position):
         menu = QMenu(self)
@@ -79,36 +179,39 @@ class ListWidget(QWidget):
         menu.exec_(self.list_view.mapToGlobal(position))
 
     def delete_selected(self):
-        indexes = self.list_view.selectedIndexes()
-        items_to_remove = []
-        for index in indexes:
-            items_to_remove.append(self.list_model.item(index.row()))
-
-        for item in items_to_remove:
-            index = self.list_model.indexFromItem(item)
-            self.list_model.removeRow(index.row())
-            self.puck_list.pop(index.row())
-            self.updated_list.emit(self.puck_list)
+        rows = sorted({index.row() for index in self.list_view.selectedIndexes()})
+        if not rows:
+            return
+        self.list_view.clearSelection()
+        self.list_model.removeRowsAt(rows)
+        self.updated_list.emit(self.puck_list)
 
     def filter_pucks(self, a0: str):
-        self.proxy_model.setFilterFixedString(a0)
+        # Restart the timer so filtering runs once typing pauses
+        self.filter_timer.start()
+
+    def apply_filter(self):
+        self.list_model.setFilter(self.search_box.text())
 
     def add_puck(self, value):
         new_puck = self.search_box.text()
+        if not new_puck:
+            return
         if new_puck in self.not_allowed:
             self.generate_error_message("Puck name already exists in the other list")
             return
-        item = QStandardItem(new_puck)
-        self.list_model.appendRow(item)
+        if new_puck in self.puck_list:
+            self.generate_error_message("Puck name already exists!")
+            return
+        self.list_model.appendName(new_puck)
         self.search_box.clear()
-        self.puck_list.append(new_puck)
         self.updated_list.emit(self.puck_list)
 
-    def set_not_allowed_list(self, not_allowed=None):
-        if not not_allowed:
-            not_allowed = []
-
-        self.not_allowed = set(not_allowed)
+    def set_not_allowed_list(self, not_allowed: "PuckList | None" = None):
+        # Keep a reference, the other list's index is already a set
+        if not_allowed is None:
+            not_allowed = PuckList()
+        self.not_allowed = not_allowed
 
     def generate_error_message(self, message):
         error_message = QMessageBox()
@@ -116,20 +219,14 @@ class ListWidget(QWidget):
         error_message.setText(message)
         error_message.exec_()
 
-    def check_item(self, item: QStandardItem):
-        new_name = item.data(0)
-        old_name = item.data(Qt.ItemDataRole.UserRole)
+    def check_rename(self, old_name: str, new_name: str) -> bool:
         if new_name in self.not_allowed:
             self.generate_error_message("Puck name already exists in the other list")
-            self.resetting_name = True
-            item.setData(old_name, 0)
-            return
-        if new_name in set(self.puck_list) and not self.resetting_name:
+            return False
+        if new_name in self.puck_list:
             self.generate_error_message("Puck name already exists!")
-            self.resetting_name = True
-            item.setData(old_name, 0)
-            return
-        item.setData(new_name, Qt.ItemDataRole.UserRole)
-        self.puck_list[item.row()] = new_name
+            return False
+        return True
+
+    def renamed(self):
         self.updated_list.emit(self.puck_list)
-        self.resetting_name = False  # Done resetting name
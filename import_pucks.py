@@ -1,32 +1,42 @@
 import getpass
-import grp
-import json
 import logging
 import os
 import sys
-import time
 import traceback
 from enum import Enum
 from pathlib import Path
-from typing import Tuple
+from typing import List, Tuple
 
-import numpy as np
-import pandas as pd
 import yaml
 from qtpy import QtWidgets
-from qtpy.QtCore import QSize, Qt
+from qtpy.QtCore import QSize, Qt, QThread
 from qtpy.QtGui import QColor, QIcon
 
 from gui.config import ConfigurationWindow
 from gui.custom_table import DewarTableWithCopy, TableWithCopy
 from utils.db_lib import DBConnection
+from utils.dewar_session import DewarSession, pending_sessions
 from utils.pandas_model import DewarPandasModel, PuckPandasModel
+from utils.puck_lists import PuckListStore
+from utils.upload_journal import sheet_hash
+from utils.workers import (
+    DewarSubmitWorker,
+    ExcelExportWorker,
+    ImportWorker,
+    PuckListWatcher,
+    StartupWorker,
+    UploadWorker,
+    ValidationWorker,
+)
 
 logger = logging.getLogger(__name__)
 logfile_path = Path("~/.puckimporter/puckimporter.log").expanduser()
 logfile_path.parent.mkdir(parents=True, exist_ok=True)
 file_handler = logging.FileHandler(logfile_path)
 file_handler.setLevel(logging.INFO)
+file_handler.setFormatter(
+    logging.Formatter("%(asctime)s %(name)s %(levelname)s: %(message)s")
+)
 
 
 class Mode(Enum):
@@ -56,55 +66,110 @@ class ControlMain(QtWidgets.QMainWindow):
         self.model = None
         self.mode = Mode.MANUAL
         self.resize(QtWidgets.QDesktopWidget().availableGeometry().size() * 0.7)  # type: ignore
-        self.validatePuckLists()
         self.status_bar = self.statusBar()
         self.mode_status = QtWidgets.QLabel(f"MODE: {self.mode.value}")
         self.status_bar.addPermanentWidget(self.mode_status)
         # Default mode to start the application
         self._set_mode(Mode.MANUAL)
+        self.pucklists = PuckListStore()
+        self.pendingPuckLists = None
+        self.dewarSession = None
+        self.validatePuckLists()
 
     def validatePuckLists(self):
-        pucklist_path = Path(self.config["list_path"])
-        if not pucklist_path.exists():
-            self.showModalMessage(
-                "Error",
-                f"Puck list file {pucklist_path} not found. White list and black list are empty",
+        """Load the puck lists, check admin rights and optionally check the
+        database answers in the background while the window is shown"""
+        self._setPuckListActionsEnabled(False)
+        self.status_bar.showMessage("Loading puck lists...")
+        self.startupWorker = StartupWorker(
+            Path(self.config["list_path"]),
+            self.config.get("admin_group"),
+            self._dbFactory() if self.config.get("warmup_db", False) else None,
+        )
+        self.startupWorker.lists_loaded.connect(self._puckListsLoaded)
+        self.startupWorker.admin_resolved.connect(self._adminResolved)
+        self.startupWorker.warmed_up.connect(self._databaseWarmedUp)
+        self.startupWorker.start()
+
+    def _dbFactory(self):
+        """Factory of database connections for workers, it only captures
+        plain values so it can be called from any thread"""
+        beamline_id = self.config.get("beamline", "99id1").lower()
+        host = self.config.get(
+            "database_host", os.environ.get("MONGODB_HOST", "localhost")
+        )
+        owner = self.owner
+
+        def db_factory(metrics=None):
+            return DBConnection(
+                beamline_id=beamline_id, host=host, owner=owner, metrics=metrics
             )
-            self.pucklists = {"blacklist": [], "whitelist": [], "etched": []}
-        else:
-            self.parsePuckList(pucklist_path)
-
-    def parsePuckList(self, path: Path):
-        parse_excel = False
-        if path.suffix == ".json":
-            with path.open("r") as f:
-                self.pucklists = json.load(f)
-                for label in ["whitelist", "blacklist", "etched"]:
-                    if label not in self.pucklists.keys():
-                        self.pucklists[label] = []
-        elif path.suffix == ".xlsx":
-            engine = "openpyxl"
-            parse_excel = True
-        elif path.suffix == ".xls":
-            engine = "xlrd"
-            parse_excel = True
-
-        if parse_excel:
-            self.pucklists = {}
-            reader = pd.ExcelFile(path, engine=engine)
-            self.pucklists["etched"] = self.get_sheet_data(reader, "etched")
-            self.pucklists["whitelist"] = self.get_sheet_data(reader, "white_list")
-            self.pucklists["blacklist"] = self.get_sheet_data(reader, "black_list")
-
-    def get_sheet_data(self, reader: pd.ExcelFile, sheet):
-        df = reader.parse(
-            sheet_name=sheet,
-            header=None,
+
+        return db_factory
+
+    def _setPuckListActionsEnabled(self, enabled: bool):
+        for action in (
+            self.importExcelAction,
+            self.validateExcelAction,
+            self.submitPuckDataAction,
+            self.configWindowAction,
+        ):
+            action.setEnabled(enabled)
+
+    def _puckListsLoaded(self, store: PuckListStore, message: str):
+        self.pucklists = store
+        if message:
+            self.showModalMessage("Error", message)
+        self._setPuckListActionsEnabled(True)
+        self.status_bar.showMessage("Puck lists loaded", 5000)
+
+        self.puckListWatcher = PuckListWatcher(
+            Path(self.config["list_path"]),
+            interval=self.config.get("list_poll_interval", 5),
+            parent=self,
+        )
+        self.puckListWatcher.reloaded.connect(self.swapPuckLists)
+        self.puckListWatcher.start()
+
+    def _adminResolved(self, is_admin: bool):
+        if is_admin:
+            self.dataMenu.addAction(self.configWindowAction)
+            self.menuBar().addMenu(self.dewarScanMenu)
+            self.dewarScanMenu.addAction(self.beginDewarScanAction)
+            self.dewarScanMenu.addAction(self.submitDewarAction)
+
+    def _databaseWarmedUp(self, message: str):
+        if message:
+            logger.warning(f"Database not reachable at startup: {message}")
+
+    def swapPuckLists(self, store: PuckListStore):
+        if store.toDict() == self.pucklists.toDict():
+            return
+        config_window = getattr(self, "configWindow", None)
+        if config_window is not None and config_window.isVisible():
+            # The configuration window edits the current lists, swap once it closes
+            self.pendingPuckLists = store
+            return
+        self.pucklists = store
+        self.pendingPuckLists = None
+        self.statusBar().showMessage("Puck lists reloaded", 5000)
+        if not isinstance(self.model, PuckPandasModel):
+            return
+        self.model.setPuckLists(store)
+        busy = getattr(self, "busy_dialog", None)
+        if busy is not None and busy.isVisible():
+            # The running validation picked up the old lists, validate again later
+            return
+        worker = ValidationWorker(
+            self.model._dataframe.copy(), self.pucklists, self.config, self.thread()
+        )
+        self._runSheetWorker(
+            worker, "Puck lists changed, validating again...", self._revalidated
         )
-        if len(df.columns) > 0:
-            return df.iloc[:, 0].to_list()
-        else:
-            return []
+
+    def _applyPendingPuckLists(self):
+        if self.pendingPuckLists is not None:
+            self.swapPuckLists(self.pendingPuckLists)
 
     def _createActions(self):
         # File menu actions
@@ -138,6 +203,8 @@ class ControlMain(QtWidgets.QMainWindow):
         # Shipping Dewar menu
         self.beginDewarScanAction = QtWidgets.QAction("&Begin Dewar Scan", self)
         self.beginDewarScanAction.triggered.connect(self.setupDewarScan)
+        self.submitDewarAction = QtWidgets.QAction("S&ubmit Dewar contents", self)
+        self.submitDewarAction.triggered.connect(self.submitDewarData)
 
     def _set_mode(self, mode):
         self.mode = mode
@@ -152,16 +219,107 @@ class ControlMain(QtWidgets.QMainWindow):
             self.owner = getpass.getuser()
 
     def setupDewarScan(self):
-        empty_frame = {None: [""]}
-        data = pd.DataFrame.from_dict(empty_frame)
-        self.model = DewarPandasModel(data, parent=self)
+        self.model = DewarPandasModel(parent=self)
         self.tableView = self._createTableView()
         self.setCentralWidget(self.tableView)
         self.tableView.setModel(self.model)
-        self.tableView.resizeColumnsToContents()
+        if self.dewarSession is not None:
+            # Left on disk, it is offered again the next time a scan begins
+            self.dewarSession.close()
+            self.dewarSession = None
+        self._setDewarSession(self._openDewarSession())
         next_index = self.model.index(0, 0)
         self.tableView.setCurrentIndex(next_index)
 
+    def _setDewarSession(self, session: DewarSession):
+        if self.dewarSession is not None:
+            self.model.dewarScanned.disconnect(self.dewarSession.recordDewar)
+            self.model.puckScanned.disconnect(self.dewarSession.recordPuck)
+        self.dewarSession = session
+        self.model.dewarScanned.connect(session.recordDewar)
+        self.model.puckScanned.connect(session.recordPuck)
+
+    def _openDewarSession(self) -> DewarSession:
+        for path in pending_sessions():
+            session = DewarSession(path)
+            if not session.resumed:
+                session.complete()
+                continue
+            answer = QtWidgets.QMessageBox.question(
+                self,
+                "Unfinished dewar scan",
+                f"A dewar scan from {path.stem} was not submitted, restore it?",
+            )
+            if answer == QtWidgets.QMessageBox.StandardButton.Yes:
+                self.model.restore(session.headers, session.cells)
+                return session
+            session.complete()
+        return DewarSession()
+
+    def submitDewarData(self):
+        if not isinstance(self.model, DewarPandasModel):
+            self.showModalMessage("Error", "Begin a dewar scan before submitting")
+            return
+        dewars = self.model.dewarContents()
+        if not dewars:
+            self.showModalMessage("Error", "No dewar has been scanned")
+            return
+        self.progress_dialog = QtWidgets.QProgressDialog(
+            "Submitting dewar contents...", "Cancel", 0, len(dewars), self
+        )
+        self.progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        self.progress_dialog.setAutoReset(False)
+
+        self.dewar_thread = QThread(self)
+        worker = DewarSubmitWorker(
+            dewars,
+            self._dbFactory(),
+            max_workers=self.config.get("upload_workers", 4),
+        )
+        worker.moveToThread(self.dewar_thread)
+        self.dewar_thread.started.connect(worker.run)
+        worker.progress.connect(self.progress_dialog.setValue)
+        self.progress_dialog.canceled.connect(lambda: worker.cancel())
+        worker.finished.connect(self._dewarSubmitFinished)
+        worker.error.connect(self._dewarSubmitFailed)
+        worker.finished.connect(self.dewar_thread.quit)
+        worker.error.connect(self.dewar_thread.quit)
+        self.dewar_thread.finished.connect(worker.deleteLater)
+        self.dewar_thread.finished.connect(self.dewar_thread.deleteLater)
+        self.dewar_worker = worker
+
+        self.submitDewarAction.setEnabled(False)
+        self.progress_dialog.setValue(0)
+        self.progress_dialog.show()
+        self.dewar_thread.start()
+
+    def _dewarSubmitFinished(self, canceled: bool, foreign_pucks: List[str]):
+        self.progress_dialog.close()
+        self.submitDewarAction.setEnabled(True)
+        if canceled:
+            self.showModalMessage("Cancelled", "Dewar submit cancelled")
+            return
+        if self.dewarSession is not None:
+            self.dewarSession.complete()
+            # Scans added after the submit go to a new log holding the table
+            session = DewarSession()
+            session.seed(*self.model.scanState())
+            self._setDewarSession(session)
+        message = "Submitted dewar contents successfully"
+        if foreign_pucks:
+            message += (
+                f"\n{len(foreign_pucks)} pucks belong to other users and were linked"
+                f" without creating new ones: {', '.join(foreign_pucks)}"
+            )
+        self.showModalMessage("Success", message)
+
+    def _dewarSubmitFailed(self, message: str):
+        self.progress_dialog.close()
+        self.submitDewarAction.setEnabled(True)
+        self.showModalMessage(
+            "Error", f"Dewar submit failed, submit again.\nException: {message}"
+        )
+
     def saveExcel(self):
         filepath, _ = QtWidgets.QFileDialog().getSaveFileName(self, "Save file")
         if filepath:
@@ -173,7 +331,20 @@ class ControlMain(QtWidgets.QMainWindow):
                 engine = "xlrd"
 
             if self.model:
-                self.model._dataframe.to_excel(filepath, engine=engine, index=False)
+                # Copy so edits made while the file is written do not race it
+                self.export_worker = ExcelExportWorker(
+                    self.model.toDataFrame().copy(), filepath, engine
+                )
+                self.export_worker.finished.connect(self._excelSaved)
+                self.status_bar.showMessage(f"Saving {filepath}...")
+                self.export_worker.start()
+
+    def _excelSaved(self, filepath: Path, message: str):
+        if message:
+            self.status_bar.clearMessage()
+            self.showModalMessage("Error", f"Could not save {filepath}: {message}")
+        else:
+            self.status_bar.showMessage(f"Saved {filepath}", 5000)
 
     def identify_excel_format(self, file_path):
         with open(file_path, "rb") as f:
@@ -196,75 +367,66 @@ class ControlMain(QtWidgets.QMainWindow):
         filename, _ = dialog.getOpenFileName(
             self, "Import file", filter="Excel (*.xls *.xlsx)"
         )
-        required_columns_list = [
-            "puckname",
-            "position",
-            "samplename",
-            "model",
-            "sequence",
-            "proposalnum",
-        ]
         if filename:
-            engine = self.identify_excel_format(filename)
-            excel_file = pd.ExcelFile(filename, engine=engine)
-            for sheet_name in excel_file.sheet_names:
-                data = excel_file.parse(sheet_name)
-                if data.empty:
-                    continue
-                # Check if any row besides header row contains "puckname"
-                rows = (data.applymap(lambda x: str(x).lower() == "puckname")).any(
-                    axis=1
-                )
-
-                required_columns = set(required_columns_list)
-                header_correct = required_columns.issubset(
-                    (
-                        col.strip().lower()
-                        for col in data.columns
-                        if isinstance(col, str)
-                    )
-                )
-                if not rows.all() and not header_correct:
-                    import_offset = data.loc[rows].first_valid_index()
-                    if isinstance(import_offset, (int, np.integer)):
-                        data = excel_file.parse(
-                            sheet_name=sheet_name, skiprows=import_offset + 1
-                        )
-                data.rename(
-                    columns={
-                        col: col.strip().lower()
-                        for col in data.columns
-                        if isinstance(col, str)
-                    },
-                    inplace=True,
-                )
-                # Check headers again after offset
-                header_correct = required_columns.issubset(
-                    (
-                        col.strip().lower()
-                        for col in data.columns
-                        if isinstance(col, str)
-                    )
-                )
-                if header_correct:
-                    self.model = PuckPandasModel(data)
-                    self.model.setPuckLists(self.pucklists)
-                    self.validateExcel()
-                    self.tableView.setModel(self.model)
-                    break
-            self.tableView.resizeColumnsToContents()
+            worker = ImportWorker(
+                filename,
+                self.identify_excel_format(filename),
+                self.pucklists,
+                self.config,
+                self.thread(),
+            )
+            self._runSheetWorker(worker, "Importing Excel file...", self._validated)
 
     def validateExcel(self):
         if not isinstance(self.model, PuckPandasModel):
             return
-        try:
-            self.model.preprocessData()
-            self.model.validateData(self.config)
+        worker = ValidationWorker(
+            self.model._dataframe.copy(), self.pucklists, self.config, self.thread()
+        )
+        self._runSheetWorker(worker, "Validating Excel file...", self._validated)
+
+    def _runSheetWorker(self, worker: ValidationWorker, label: str, callback):
+        """Run an import or validation worker behind a busy indicator and pass
+        the validated model and error message to callback"""
+        self.busy_dialog = QtWidgets.QProgressDialog(label, "Cancel", 0, 0, self)
+        self.busy_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        self.busy_dialog.setMinimumDuration(0)
+
+        thread = QThread(self)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        self.busy_dialog.canceled.connect(lambda: worker.cancel())
+        worker.finished.connect(self.busy_dialog.close)
+        worker.finished.connect(callback)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        self.sheet_worker = worker
+        self.busy_dialog.show()
+        thread.start()
+
+    def _setModel(self, model: PuckPandasModel):
+        self.model = model
+        self.tableView.setModel(self.model)
+
+    def _validated(self, model, message: str):
+        if model is None:
+            if message:
+                self.showModalMessage("Error", message)
+            return
+        self._setModel(model)
+        if message:
+            self.showModalMessage("Error", message)
+        else:
             self.showModalMessage("Success", "Validated excel sucessfully")
 
-        except TypeError as e:
-            logger.error(f"TypeError: {traceback.format_exc()}")
-            self.showModalMessage("Error", e)
+    def _revalidated(self, model, message: str):
+        # The user did not ask for this validation, only errors need a dialog
+        if model is not None and not message:
+            self._setModel(model)
+            self.statusBar().showMessage("Validated again against the reloaded lists", 5000)
+            return
+        self._validated(model, message)
 
     def showModalMessage(self, title, message):
         self.msg = QtWidgets.QMessageBox()
@@ -274,76 +436,86 @@ class ControlMain(QtWidgets.QMainWindow):
         self.msg.show()
 
     def submitPuckData(self):
-        try:
-            if isinstance(self.model, PuckPandasModel):
-                self.model.preprocessData()
-                self.model.validateData(self.config)
-        except Exception as e:
-            logger.error(f"TypeError: {traceback.format_exc()}")
-            self.showModalMessage(
-                "Error", f"Data not validated, will not upload.\nException: {e}"
-            )
+        if not isinstance(self.model, PuckPandasModel):
+            self.showModalMessage("Error", "Invalid data, will not upload to database")
             return
+        worker = ValidationWorker(
+            self.model._dataframe.copy(),
+            self.pucklists,
+            self.config,
+            self.thread(),
+            db_factory=self._dbFactory(),
+        )
+        self._runSheetWorker(worker, "Validating Excel file...", self._submitValidated)
 
-        if isinstance(self.model, PuckPandasModel):
-            beamline_id = self.config.get("beamline", "99id1").lower()
-            dbConnection = DBConnection(
-                beamline_id=beamline_id,
-                host=self.config.get(
-                    "database_host", os.environ.get("MONGODB_HOST", "localhost")
-                ),
-                owner=self.owner,
+    def _submitValidated(self, model, message: str):
+        if model is None:
+            return
+        self._setModel(model)
+        if message:
+            self.showModalMessage(
+                "Error", f"Data not validated, will not upload.\nException: {message}"
             )
-            self.progress_dialog = QtWidgets.QProgressDialog(
-                "Uploading Puck data...",
-                "Cancel",
-                0,
-                self.model.rowCount(),
-                self,
+            return
+        self._uploadPuckData()
+
+    def _uploadPuckData(self):
+        beamline_id = self.config.get("beamline", "99id1").lower()
+        owner = self.owner
+        self.progress_dialog = QtWidgets.QProgressDialog(
+            "Uploading Puck data...",
+            "Cancel",
+            0,
+            self.model.rowCount(),
+            self,
+        )
+        self.progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        self.progress_dialog.setAutoReset(False)
+
+        self.upload_thread = QThread(self)
+        worker = UploadWorker(
+            self.model._dataframe.to_dict("records"),
+            self._dbFactory(),
+            sheet_hash(self.model._dataframe, beamline_id, owner),
+            batch_size=self.config.get("upload_batch_size", 16),
+            max_workers=self.config.get("upload_workers", 4),
+            metrics_path=self.config.get("metrics_path"),
+            diff=self.config.get("upload_diff", False),
+        )
+        worker.moveToThread(self.upload_thread)
+        self.upload_thread.started.connect(worker.run)
+        worker.progress.connect(self.progress_dialog.setValue)
+        # The worker's thread is busy uploading, so cancel from the GUI thread
+        self.progress_dialog.canceled.connect(lambda: worker.cancel())
+        worker.finished.connect(self._uploadFinished)
+        worker.error.connect(self._uploadFailed)
+        worker.finished.connect(self.upload_thread.quit)
+        worker.error.connect(self.upload_thread.quit)
+        self.upload_thread.finished.connect(worker.deleteLater)
+        self.upload_thread.finished.connect(self.upload_thread.deleteLater)
+        self.upload_worker = worker
+
+        self.submitPuckDataAction.setEnabled(False)
+        self.progress_dialog.setValue(0)
+        self.progress_dialog.show()
+        self.upload_thread.start()
+
+    def _uploadFinished(self, canceled: bool):
+        self.progress_dialog.close()
+        self.submitPuckDataAction.setEnabled(True)
+        if canceled:
+            self.showModalMessage(
+                "Cancelled", "Upload cancelled, submit again to resume"
             )
-            # self.progress_dialog.setModal(True)
-            self.progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
-            prevPuckName = None
-            puck_id = None
-            self.currentPucks = set()
-            self.progress_dialog.show()
-            self.progress_dialog.setValue(0)
-            time.sleep(
-                0.25
-            )  # Dumb sleep because progress dialog doesn't initialize fast enough
-            for i, row in enumerate(self.model.rows()):
-                print(f"Processing row {i}")
-                self.progress_dialog.setValue(i + 1)
-                if self.progress_dialog.wasCanceled():
-                    break
-                # Check if puck exists, otherwise create one
-                if row["puckname"] != prevPuckName:
-                    puck_id = dbConnection.getOrCreateContainerID(
-                        row["puckname"], 16, "16_pin_puck"
-                    )
-                    prevPuckName = row["puckname"]
-
-                # Create sample
-                sampleName: str = row["samplename"]
-                model = row["model"]
-                seq = row["sequence"]
-                propNum = row["proposalnum"]
-                sampleID = dbConnection.createSample(
-                    str(sampleName),
-                    "pin",
-                    model=None if pd.isna(model) else str(model),
-                    sequence=None if pd.isna(seq) else str(seq),
-                    proposalID=propNum,
-                    container=puck_id,
-                )
-                if puck_id not in self.currentPucks:
-                    dbConnection.emptyContainer(puck_id)
-                    self.currentPucks.add(puck_id)
-                dbConnection.insertIntoContainer(
-                    puck_id, int(row["position"]) - 1, sampleID
-                )
         else:
-            self.showModalMessage("Error", "Invalid data, will not upload to database")
+            self.showModalMessage("Success", "Uploaded puck data successfully")
+
+    def _uploadFailed(self, message: str):
+        self.progress_dialog.close()
+        self.submitPuckDataAction.setEnabled(True)
+        self.showModalMessage(
+            "Error", f"Upload failed, submit again to resume.\nException: {message}"
+        )
 
     def _createMenuBar(self):
         menuBar = self.menuBar()
@@ -365,12 +537,9 @@ class ControlMain(QtWidgets.QMainWindow):
         modeSubMenu = dataMenu.addMenu("Mode")
         modeSubMenu.addActions([self.manualModeAction, self.automatedModeAction])
 
-        if self.config["admin_group"] in [
-            grp.getgrgid(g).gr_name for g in os.getgroups()
-        ]:
-            dataMenu.addAction(self.configWindowAction)
-            menuBar.addMenu(dewarScanMenu)
-            dewarScanMenu.addAction(self.beginDewarScanAction)
+        # Admin only menus are added once group membership is resolved
+        self.dataMenu = dataMenu
+        self.dewarScanMenu = dewarScanMenu
 
     def _createTableView(self, dewar=False):
         # view = QtWidgets.QTableView()
@@ -388,12 +557,16 @@ class ControlMain(QtWidgets.QMainWindow):
         self.configWindow = ConfigurationWindow(
             config=self.config, puck_list=self.pucklists
         )
+        self.configWindow.finished.connect(self._applyPendingPuckLists)
         self.config = self.configWindow.config
         with self.config_path.open("w") as f:
             yaml.safe_dump(self.config, f)
 
 
 def start_app(config_path):
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(file_handler)
     app = QtWidgets.QApplication(sys.argv)
     app.setWindowIcon(QIcon(str(Path.cwd() / Path("gui/assets/icon.png"))))
     ex = ControlMain(config_path=config_path)
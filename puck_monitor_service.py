@@ -3,7 +3,6 @@ from utils.devices import create_dewar_class, Dewar
 import argparse
 import yaml
 from pathlib import Path
-from import_pucks import start_app
 import traceback
 
 
@@ -52,6 +51,8 @@ def main():
                       name="dewar", 
                       beamline_id=config["dewar"]["beamline"], 
                       db_host=config["dewar"]["db_host"],
+                      reconcile_timeout=config["dewar"].get("reconcile_timeout", 2.0),
+                      debounce=config["dewar"].get("debounce", 0.5),
                       )
     except Exception as e:
         print(f"Exception: {e}")
@@ -0,0 +1,185 @@
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import AbstractSet, Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.db_lib import DBConnection
+from utils.upload_journal import journal_dir, journaled_samples, stale_journals
+
+
+def init_argparse() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        usage="%(prog)s [OPTION]...",
+        description="Find samples that no container holds and that have no requests,"
+        " then report, archive or delete them",
+    )
+    parser.add_argument("--host", help="amostra/conftrak host, defaults to MONGODB_HOST")
+    parser.add_argument("--owner", help="only collect samples of this owner")
+    parser.add_argument(
+        "--mode",
+        choices=["report", "archive", "delete"],
+        default="report",
+        help="report (dry run, the default), archive or delete orphaned samples",
+    )
+    parser.add_argument(
+        "--archive-path",
+        type=Path,
+        default=Path(f"orphaned_samples_{time.strftime('%Y%m%d-%H%M%S')}.jsonl"),
+        help="JSON lines file the archived or deleted samples are written to",
+    )
+    parser.add_argument(
+        "--min-age",
+        type=float,
+        default=24,
+        help="hours a sample must exist before it can be collected, covers uploads"
+        " still running or waiting to resume on another machine",
+    )
+    parser.add_argument(
+        "--journal-dir",
+        type=Path,
+        default=journal_dir,
+        help="upload journals whose samples are never collected",
+    )
+    parser.add_argument(
+        "--journal-max-age",
+        type=float,
+        default=7,
+        help="days after which an unfinished upload journal is stale: its samples"
+        " can be collected and archive or delete mode removes it",
+    )
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument(
+        "--show", type=int, default=20, help="orphaned samples listed in the report"
+    )
+    return parser
+
+
+def _batches(items: List[Any], batch_size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), batch_size):
+        yield items[start : start + batch_size]
+
+
+def find_orphaned_samples(
+    db: DBConnection,
+    owner: Optional[str] = None,
+    batch_size: int = 200,
+    include_archived: bool = False,
+    min_age: float = 0,
+    protected: AbstractSet[str] = frozenset(),
+) -> Tuple[int, List[Dict[str, Any]]]:
+    """Samples not held by any container and without requests.
+
+    Samples are read before containers, so a sample created and placed in
+    a puck during the scan is never a candidate. Samples younger than
+    `min_age` seconds or in `protected` (uploads that have not completed)
+    are kept, as are samples archived by an earlier run unless
+    `include_archived`. Samples and containers are each read with a single
+    find, requests with one query per batch of candidates. Returns the
+    number of samples scanned and the orphaned samples.
+    """
+    query = {} if owner is None else {"owner": owner}
+    cutoff = time.time() - min_age
+    scanned = 0
+    candidates = []
+    for sample in db.sample_ref.find(**query):
+        scanned += 1
+        if sample.get("archived", False) and not include_archived:
+            continue
+        if sample.get("time", 0) > cutoff or sample["uid"] in protected:
+            continue
+        candidates.append(sample)
+
+    referenced = set()
+    for container in db.container_ref.find():
+        referenced.update(uid for uid in container.get("content", []) if uid)
+    candidates = [sample for sample in candidates if sample["uid"] not in referenced]
+
+    requested = set()
+    for batch in _batches([sample["uid"] for sample in candidates], batch_size):
+        for request in db.request_ref.find(sample={"$in": batch}):
+            requested.add(request.get("sample"))
+    return scanned, [sample for sample in candidates if sample["uid"] not in requested]
+
+
+def _write_archive(path: Path, samples: List[Dict[str, Any]]) -> None:
+    with path.open("a") as f:
+        for sample in samples:
+            f.write(json.dumps(sample, default=str) + "\n")
+        f.flush()
+
+
+def archive_samples(
+    db: DBConnection, samples: List[Dict[str, Any]], path: Path, batch_size: int = 200
+) -> int:
+    """Copy samples to `path` and mark them archived, one update per batch"""
+    archived = 0
+    for batch in _batches(samples, batch_size):
+        _write_archive(path, batch)
+        uids = [sample["uid"] for sample in batch]
+        db.sample_ref.update({"uid": {"$in": uids}}, {"archived": True})
+        archived += len(batch)
+    return archived
+
+
+def delete_samples(
+    db: DBConnection, samples: List[Dict[str, Any]], path: Path, batch_size: int = 200
+) -> int:
+    """Copy samples to `path` and delete them, one delete per batch"""
+    # Not every amostra client version can delete documents
+    delete = getattr(db.sample_ref, "delete", None)
+    if delete is None:
+        raise RuntimeError(
+            "The sample reference cannot delete documents, use --mode archive"
+        )
+    deleted = 0
+    for batch in _batches(samples, batch_size):
+        _write_archive(path, batch)
+        delete({"uid": {"$in": [sample["uid"] for sample in batch]}})
+        deleted += len(batch)
+    return deleted
+
+
+def main(db: Optional[DBConnection] = None, argv: Optional[List[str]] = None) -> int:
+    args = init_argparse().parse_args(argv)
+    if db is None:
+        db = DBConnection(host=args.host)
+    batch_size = max(1, args.batch_size)
+
+    start = time.perf_counter()
+    # Deleting also removes samples an earlier run archived
+    scanned, orphans = find_orphaned_samples(
+        db,
+        args.owner,
+        batch_size,
+        include_archived=args.mode == "delete",
+        min_age=args.min_age * 3600,
+        protected=journaled_samples(args.journal_dir, args.journal_max_age * 86400),
+    )
+    print(
+        f"Scanned {scanned} samples in {time.perf_counter() - start:.1f}s,"
+        f" {len(orphans)} are in no container and have no requests"
+    )
+    for sample in orphans[: args.show]:
+        print(f"  {sample['uid']} {sample.get('name')} owner={sample.get('owner')}")
+    if len(orphans) > args.show:
+        print(f"  ... and {len(orphans) - args.show} more")
+
+    if args.mode == "archive":
+        count = archive_samples(db, orphans, args.archive_path, batch_size)
+        print(f"Archived {count} samples, copies written to {args.archive_path}")
+    elif args.mode == "delete":
+        count = delete_samples(db, orphans, args.archive_path, batch_size)
+        print(f"Deleted {count} samples, copies written to {args.archive_path}")
+    else:
+        print("Dry run, nothing was changed. Use --mode archive or --mode delete")
+        return 0
+
+    for path in stale_journals(args.journal_dir, args.journal_max_age * 86400):
+        path.unlink(missing_ok=True)
+        print(f"Removed stale upload journal {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,7 +1,5 @@
 import argparse
-import yaml
 from pathlib import Path
-from import_pucks import start_app
 
 
 def init_argparse() -> argparse.ArgumentParser:
@@ -30,6 +28,9 @@ def main() -> None:
         return
     
     try:
+        # Qt and pandas are only loaded once the arguments are known to be good
+        from import_pucks import start_app
+
         start_app(config_path)
     except Exception as e:
         print(f'Exception occurred: {e}')
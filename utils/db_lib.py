@@ -1,16 +1,53 @@
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Set
 import time
 import getpass
-import amostra.client.commands as acc
-import conftrak.client.commands as ccc
 
+from utils.metrics import DBMetrics, TimedReference
+
+# amostra and conftrak clients are imported on first connection, they are
+# slow to import and not needed when running against local references
 # from analysisstore.client.commands import AnalysisClient
-import conftrak.exceptions
+
+
+def _conftrak_not_found():
+    import conftrak.exceptions
+
+    return conftrak.exceptions.ConfTrakNotFoundException
 
 
 class DBConnection:
-    def __init__(self, beamline_id="99id1", host=None, owner=None):
+    def __init__(
+        self,
+        beamline_id="99id1",
+        host=None,
+        owner=None,
+        metrics: "DBMetrics | None" = None,
+        references: "Dict[str, Any] | None" = None,
+    ):
+        if references is None:
+            references = self._connect(host)
+        self.sample_ref = references["sample"]
+        self.container_ref = references["container"]
+        self.request_ref = references["request"]
+        self.configuration_ref = references["configuration"]
+
+        if metrics is not None:
+            self.sample_ref = TimedReference(self.sample_ref, metrics)
+            self.container_ref = TimedReference(self.container_ref, metrics)
+            self.request_ref = TimedReference(self.request_ref, metrics)
+            self.configuration_ref = TimedReference(self.configuration_ref, metrics)
+        self.metrics = metrics
+        self.beamline_id = beamline_id
+        if owner is not None:
+            self.owner = getpass.getuser()
+        else:
+            self.owner = owner
+
+    def _connect(self, host=None) -> Dict[str, Any]:
+        import amostra.client.commands as acc
+        import conftrak.client.commands as ccc
+
         if not host:
             main_server = os.environ.get("MONGODB_HOST", "localhost")
         else:
@@ -22,18 +59,19 @@ class DBConnection:
             "metadataservice": {"host": main_server, "port": "7772"},
             "analysisstore": {"host": main_server, "port": "7773"},
         }
-        self.sample_ref = acc.SampleReference(**services_config["amostra"])
-        self.container_ref = acc.ContainerReference(**services_config["amostra"])
-        self.request_ref = acc.RequestReference(**services_config["amostra"])
+        return {
+            "sample": acc.SampleReference(**services_config["amostra"]),
+            "container": acc.ContainerReference(**services_config["amostra"]),
+            "request": acc.RequestReference(**services_config["amostra"]),
+            "configuration": ccc.ConfigurationReference(
+                **services_config["conftrak"]
+            ),
+        }
 
-        self.configuration_ref = ccc.ConfigurationReference(
-            **services_config["conftrak"]
-        )
-        self.beamline_id = beamline_id
-        if owner is not None:
-            self.owner = getpass.getuser()
-        else:
-            self.owner = owner
+    def warmup(self):
+        # One cheap query to check the server answers. Building the
+        # connection has already imported the client modules
+        self.getContainer(filter={"uid": ""})
 
     def getContainer(self, filter=None):
         container = {}
@@ -63,6 +101,32 @@ class DBConnection:
             container_id = container["uid"]
         return container_id
 
+    def getContainersByName(
+        self,
+        names,
+        kind: "str | None",
+        batch_size: int = 200,
+        match_owner: bool = True,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Latest container of each name, fetched with one query per batch.
+        `kind` None and `match_owner` False look at containers of any kind
+        and owner"""
+        names = list(dict.fromkeys(names))
+        containers: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(names), batch_size):
+            query: Dict[str, Any] = {"name": {"$in": names[start : start + batch_size]}}
+            if kind is not None:
+                query["kind"] = kind
+            if match_owner:
+                query["owner"] = self.owner
+            for container in self.container_ref.find(**query):
+                current = containers.get(container["name"])
+                if current is None or container.get(
+                    "modified_time", float("-inf")
+                ) > current.get("modified_time", float("-inf")):
+                    containers[container["name"]] = container
+        return containers
+
     def updateContainer(
         self, container: Dict[str, Any]
     ):  # really updating the contents
@@ -93,6 +157,16 @@ class DBConnection:
             return True
         return False
 
+    def setContainerPositions(self, parent_uid, positions: Dict[int, str]):
+        # Fill several positions with a single read and write of the container
+        parent_container = self.getContainer(filter={"uid": parent_uid})
+        if parent_container:
+            for position, child_uid in positions.items():
+                parent_container["content"][position] = child_uid
+            self.updateContainer(parent_container)
+            return True
+        return False
+
     def removeFromContainer(self, parent_uid, position, child_uid):
         parent_container = self.getContainer(filter={"uid": parent_uid})
         if parent_container:
@@ -126,7 +200,7 @@ class DBConnection:
             return bli['info']
 
         # else it's a create
-        except conftrak.exceptions.ConfTrakNotFoundException:
+        except _conftrak_not_found():
             return {}
 
     @property
@@ -143,6 +217,28 @@ class DBConnection:
             return samples[0]
         return {}
 
+    def getSamplesByID(self, uids, batch_size: int = 200) -> Dict[str, Dict[str, Any]]:
+        """Samples by uid, fetched with one query per batch"""
+        uids = list(dict.fromkeys(uids))
+        samples: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(uids), batch_size):
+            query = {"uid": {"$in": uids[start : start + batch_size]}}
+            for sample in self.sample_ref.find(**query):
+                samples[sample["uid"]] = sample
+        return samples
+
+    def getSampleNames(self, proposalID, exclude_containers=()) -> Set[str]:
+        """Names of the proposal's samples outside the given containers, with
+        one query"""
+        proposals = [proposalID]
+        if str(proposalID).isdigit():
+            # Proposal numbers have been stored as both strings and integers
+            proposals = [str(proposalID), int(proposalID)]
+        query = {"proposalID": {"$in": proposals}}
+        if exclude_containers:
+            query["container"] = {"$nin": list(exclude_containers)}
+        return {sample["name"] for sample in self.sample_ref.find(**query)}
+
     def createSample(self, sample_name, kind="pin", proposalID=None, **kwargs):
         if "request_count" not in kwargs:
             kwargs["request_count"] = 0
@@ -3,7 +3,11 @@ from ophyd import DynamicDeviceComponent as DDC
 from ophyd import Component as Cpt
 from utils.db_lib import DBConnection
 from itertools import product
-from typing import Any
+from typing import Any, Dict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import threading
+import time
+import traceback
 
 
 class Puck(Device):
@@ -27,27 +31,168 @@ class Dewar(Device):
     )
     num_sectors = 8
 
-    def __init__(self, *args, beamline_id='amx', db_host='localhost', owner='mx', **kwargs):
+    def __init__(self, *args, beamline_id='amx', db_host='localhost', owner='mx',
+                 reconcile_timeout=2.0, debounce=0.5, **kwargs):
         super().__init__(*args, **kwargs)
         self.db_connection = DBConnection(beamline_id=beamline_id, host=db_host, owner=owner)
-        
+
+        # Catch up on loads and unloads missed while the service was down,
+        # then only react to changes
+        try:
+            committed = self.reconcile(reconcile_timeout)
+            reconciled = True
+        except Exception as e:
+            print(f"Reconciliation failed, loading each barcode as it is read: {e}")
+            traceback.print_exc()
+            committed = {}
+            reconciled = False
+        self.setupEvents(debounce, committed=committed)
+        # Without a reconciliation the first callback of every barcode
+        # loads the puck it shows, one write per position
         for i in range(1, self.num_sectors+1):
             sector: Sector = getattr(self.sectors, f"sector_{i}")
-            sector.A.barcode.subscribe(self.handle_barcode)
-            sector.B.barcode.subscribe(self.handle_barcode)
-            sector.C.barcode.subscribe(self.handle_barcode)
-    
+            sector.A.barcode.subscribe(self.handle_barcode, run=not reconciled)
+            sector.B.barcode.subscribe(self.handle_barcode, run=not reconciled)
+            sector.C.barcode.subscribe(self.handle_barcode, run=not reconciled)
+
+    def readBarcodes(self, timeout=2.0) -> Dict[int, str]:
+        """Current barcode of every position, read concurrently. Positions
+        whose PV does not answer within `timeout` seconds are left out"""
+        signals = {}
+        for i in range(1, self.num_sectors+1):
+            sector: Sector = getattr(self.sectors, f"sector_{i}")
+            for location in "ABC":
+                signals[self.pos_to_int(i, location)] = getattr(sector, location).barcode
+
+        barcodes = {}
+        executor = ThreadPoolExecutor(max_workers=len(signals))
+        futures = {
+            position: executor.submit(signal.get, timeout=timeout)
+            for position, signal in signals.items()
+        }
+        deadline = time.monotonic() + timeout
+        for position, future in futures.items():
+            try:
+                value = future.result(timeout=max(0, deadline - time.monotonic()))
+            except TimeoutError:
+                print(f"Timed out reading barcode at pos {position}")
+                continue
+            except Exception as e:
+                print(f"Could not read barcode at pos {position}: {e}")
+                continue
+            barcodes[position] = self.remove_newline(value) if isinstance(value, str) else ""
+        # Do not wait for reads that are stuck past the deadline
+        executor.shutdown(wait=False)
+        return barcodes
+
+    def reconcile(self, timeout=2.0) -> Dict[int, str]:
+        """Bring the primary dewar's content in line with the barcodes read
+        now, with one read and one update of the dewar. Returns the barcodes
+        read"""
+        barcodes = self.readBarcodes(timeout)
+        db = self.db_connection
+        dewar = db.getContainer(
+            filter={"name": db.primary_dewar_name, "owner": db.beamline_id.lower()}
+        )
+        if not dewar:
+            print("Primary dewar not found, skipping reconciliation")
+            return barcodes
+
+        pucks = db.getContainersByName(
+            [barcode for barcode in barcodes.values() if barcode], None, match_owner=False
+        )
+        content = list(dewar["content"])
+        changed = []
+        for position, barcode in sorted(barcodes.items()):
+            if position >= len(content):
+                continue
+            if not barcode:
+                puckID = ""
+            elif barcode in pucks:
+                puckID = pucks[barcode]["uid"]
+            else:
+                print(f"Puck ID not found for {barcode}")
+                continue
+            if content[position] != puckID:
+                content[position] = puckID
+                changed.append(f"{barcode or '-'} at pos {position}")
+
+        if changed:
+            db.updateContainer({"uid": dewar["uid"], "content": content})
+            print(f"Reconciled {len(changed)} positions: {', '.join(changed)}")
+        else:
+            print("Dewar content matches the barcode readers")
+        return barcodes
+
+    def setupEvents(self, debounce=0.5, committed=None):
+        """Start the per-position barcode state from the `committed` barcodes.
+        An unload is only written once the position stayed empty for
+        `debounce` seconds, 0 writes it right away"""
+        self.debounce = debounce
+        self._committed: Dict[int, str] = dict(committed or {})
+        self._pending_unloads: Dict[int, threading.Timer] = {}
+        self._events_lock = threading.Lock()
+        # Events that did not change the dewar by reason, printed on every change
+        self.suppressed = {"repeat": 0, "flap": 0}
+
     def handle_barcode(self, value, old_value, **kwargs):
         location = kwargs['obj'].parent.name.split("_")[-1]
         sector = kwargs['obj'].parent.name.split("_")[-2]
         puck_pos = self.pos_to_int(sector, location)
-        if isinstance(value, str) and value != '':
-            print(f"Loading puck {value} at pos {puck_pos}")
-            self.insertIntoContainer(value, puck_pos)
+        barcode = self.remove_newline(value) if isinstance(value, str) else ""
+
+        with self._events_lock:
+            committed = self._committed.get(puck_pos)
+            if committed is None:
+                # Not read at startup, the PV's previous value is all we know
+                committed = self.remove_newline(old_value) if isinstance(old_value, str) else ""
+            pending = self._pending_unloads.get(puck_pos)
+
+            if barcode == "":
+                if pending is not None or committed == "":
+                    self._suppress("repeat", puck_pos, barcode)
+                elif self.debounce > 0:
+                    timer = threading.Timer(
+                        self.debounce, self._unloadSettled, args=(puck_pos, committed)
+                    )
+                    timer.daemon = True
+                    self._pending_unloads[puck_pos] = timer
+                    timer.start()
+                else:
+                    self._unload(puck_pos, committed)
+                return
+
+            if pending is not None:
+                pending.cancel()
+                del self._pending_unloads[puck_pos]
+            if barcode == committed:
+                # The reader dropped the barcode and read it again
+                self._suppress("flap" if pending is not None else "repeat", puck_pos, barcode)
+                return
+            self._load(puck_pos, barcode)
 
-        elif value == "" and isinstance(old_value, str) and old_value != "":
-            print(f"Unloading puck {old_value} at pos {puck_pos}")
-            self.removeFromContainer(old_value, puck_pos)
+    def _suppress(self, reason, position, barcode):
+        self.suppressed[reason] += 1
+        counts = ", ".join(f"{key}={count}" for key, count in self.suppressed.items())
+        print(f"Ignoring {reason} of '{barcode}' at pos {position} (suppressed: {counts})")
+
+    def _unloadSettled(self, position, barcode):
+        with self._events_lock:
+            # Cancelled or replaced while waiting for the lock
+            if self._pending_unloads.get(position) is not threading.current_thread():
+                return
+            del self._pending_unloads[position]
+            self._unload(position, barcode)
+
+    def _load(self, position, barcode):
+        print(f"Loading puck {barcode} at pos {position}")
+        self._committed[position] = barcode
+        self.insertIntoContainer(barcode, position)
+
+    def _unload(self, position, barcode):
+        print(f"Unloading puck {barcode} at pos {position}")
+        self._committed[position] = ""
+        self.removeFromContainer(barcode, position)
 
     def pos_to_int(self, sector, location):
         sector = int(sector)
@@ -55,9 +200,11 @@ class Dewar(Device):
         return (sector-1)*3 + location
 
     def remove_newline(self, barcode):
+        # Readers end barcodes with a newline or a literal "\\n"
+        barcode = str(barcode).strip()
         if barcode.endswith("\\n"):
             barcode = barcode.split("\\n")[0]
-        barcode = str(barcode).strip()
+        barcode = barcode.strip()
         return barcode
 
     def insertIntoContainer(self, barcode, position):
@@ -94,6 +241,7 @@ def create_dewar_class(config: "dict[str, Any]"):
                     f"sector_{i}": (Sector, f"{{Puck:{i}", {"name": f"sector_{i}"})
                     for i in range(1, num_sectors + 1)
                 }
-            )
+            ),
+            "num_sectors": num_sectors,
         },
     )
@@ -0,0 +1,70 @@
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.jsonl_log import JsonLinesLog
+
+session_dir = Path("~/.puckimporter/dewar_sessions").expanduser()
+
+
+def pending_sessions(directory: Path = session_dir) -> List[Path]:
+    """Logs of dewar scans that were neither submitted nor discarded, newest
+    first"""
+    if not directory.exists():
+        return []
+    return sorted(directory.glob("*.jsonl"), reverse=True)
+
+
+class DewarSession(JsonLinesLog):
+    """Append-only on-disk log of a shipping dewar scan.
+
+    Every dewar and puck barcode is written as it is scanned, so a crash
+    loses nothing and the scan can be restored into a new table. Each line
+    is a JSON entry recording one of:
+      - the dewar scanned into a table column
+      - a puck barcode scanned into a cell
+    """
+
+    def __init__(self, path: Optional[Path] = None, directory: Path = session_dir):
+        if path is None:
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"{time.strftime('%Y%m%d-%H%M%S')}.jsonl"
+        self.headers: Dict[int, str] = {}
+        self.cells: Dict[int, Dict[int, str]] = {}
+        self._seeded = False
+        super().__init__(path)
+
+    def _read(self, entry) -> None:
+        if "dewar" in entry:
+            self.headers[entry["column"]] = entry["dewar"]
+        elif "puck" in entry:
+            self.cells.setdefault(entry["column"], {})[entry["row"]] = entry["puck"]
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.headers or self.cells)
+
+    def seed(self, headers: Dict[int, str], cells: Dict[int, Dict[int, str]]) -> None:
+        """Continue a table that was already submitted. It is written out with
+        the next scan, so an untouched table is not offered for restore"""
+        self.headers = dict(headers)
+        self.cells = {column: dict(rows) for column, rows in cells.items()}
+        self._seeded = True
+
+    def _append(self, entry) -> None:
+        if self._seeded:
+            self._seeded = False
+            for column, dewar in self.headers.items():
+                super()._append({"column": column, "dewar": dewar})
+            for column, rows in self.cells.items():
+                for row, puck in rows.items():
+                    super()._append({"column": column, "row": row, "puck": puck})
+        super()._append(entry)
+
+    def recordDewar(self, column: int, dewar: str) -> None:
+        self.headers[column] = dewar
+        self._append({"column": column, "dewar": dewar})
+
+    def recordPuck(self, column: int, row: int, puck: str) -> None:
+        self.cells.setdefault(column, {})[row] = puck
+        self._append({"column": column, "row": row, "puck": puck})
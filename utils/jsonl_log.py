@@ -0,0 +1,75 @@
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class JsonLinesLog:
+    """Append-only on-disk log with one JSON entry per line.
+
+    Subclasses set up their state, then call this constructor, which reads
+    the existing entries back through `_read`. New entries are written with
+    `_append` and flushed right away, so a crash loses at most the entry
+    being written.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._file = None
+        self._needs_newline = False
+        self._completed = False
+        self._load()
+
+    def _read(self, entry: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        good = 0
+        last = b""
+        with self.path.open("rb") as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A crash can leave a partially written last line
+                        logger.warning(f"Ignoring truncated entry in {self.path}")
+                        break
+                    self._read(entry)
+                good += len(line)
+                last = line
+            size = f.seek(0, 2)
+        if good < size:
+            # Cut the partial line so new entries start on a line of their own
+            with self.path.open("r+b") as f:
+                f.truncate(good)
+        self._needs_newline = bool(last) and not last.endswith(b"\n")
+
+    def _append(self, entry) -> None:
+        if self._completed:
+            # Reopening would start a new log without the earlier entries
+            logger.warning(f"Not writing {entry} to completed log {self.path}")
+            return
+        if self._file is None:
+            self._file = self.path.open("a")
+            if self._needs_newline:
+                self._file.write("\n")
+                self._needs_newline = False
+        self._file.write(json.dumps(entry) + "\n")
+        # Flushing hands the entry to the OS, enough to survive an app crash
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def complete(self) -> None:
+        """The work the log records is done, delete it"""
+        self._completed = True
+        self.close()
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,78 @@
+import copy
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List
+
+
+def _matches(document: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    for key, expected in query.items():
+        value = document.get(key)
+        if isinstance(expected, dict) and "$in" in expected:
+            if value not in expected["$in"]:
+                return False
+        elif isinstance(expected, dict) and "$nin" in expected:
+            if value in expected["$nin"]:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class LocalReference:
+    """In-process stand-in for an amostra or conftrak reference.
+
+    Documents are kept in memory and each call sleeps for `latency` seconds
+    to mimic a round trip to the service. Queries support equality and the
+    `$in`/`$nin` operators, which is all DBConnection relies on.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.documents: List[Dict[str, Any]] = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _round_trip(self) -> None:
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def create(self, **kwargs) -> str:
+        self._round_trip()
+        document = copy.deepcopy(kwargs)
+        document.setdefault("uid", str(uuid.uuid4()))
+        document.setdefault("time", time.time())
+        with self._lock:
+            self.documents.append(document)
+        return document["uid"]
+
+    def find(self, as_document=False, **kwargs) -> Iterator[Dict[str, Any]]:
+        self._round_trip()
+        with self._lock:
+            found = [copy.deepcopy(d) for d in self.documents if _matches(d, kwargs)]
+        return iter(found)
+
+    def update(self, query: Dict[str, Any], update: Dict[str, Any]) -> None:
+        self._round_trip()
+        with self._lock:
+            for document in self.documents:
+                if _matches(document, query):
+                    document.update(copy.deepcopy(update))
+
+    def delete(self, query: Dict[str, Any]) -> None:
+        # amostra may not offer deletes, the maintenance tools check for it
+        self._round_trip()
+        with self._lock:
+            self.documents = [d for d in self.documents if not _matches(d, query)]
+
+
+def local_references(latency: float = 0.0) -> Dict[str, LocalReference]:
+    """References for DBConnection backed by in-memory collections"""
+    return {
+        "sample": LocalReference(latency),
+        "container": LocalReference(latency),
+        "request": LocalReference(latency),
+        "configuration": LocalReference(latency),
+    }
@@ -0,0 +1,82 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# Smallest valid JPEG markers around some filler bytes, enough for clients
+# that only store the bytes
+default_image = b"\xff\xd8\xff\xe0" + b"\x00" * 1024 + b"\xff\xd9"
+
+
+class LocalImageServer:
+    """In-process stand-in for the crystal camera's snapshot URL.
+
+    Every GET returns `image` as a JPEG over HTTP/1.1 keep-alive, after
+    sleeping `latency` seconds. `requests` and `connections` count the
+    snapshots served and the TCP connections they arrived on, so a test
+    can check that a session reuses its connection.
+
+        with LocalImageServer() as server:
+            daq_utils.xtal_url = server.url
+    """
+
+    def __init__(self, image: bytes = default_image, latency: float = 0.0) -> None:
+        self.image = image
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/snapshot.jpg"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    threading.Event().wait(server.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(server.image)))
+                self.end_headers()
+                self.wfile.write(server.image)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "LocalImageServer":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="LocalImageServer", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "LocalImageServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
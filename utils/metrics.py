@@ -0,0 +1,123 @@
+import json
+import math
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Reference methods that each cost one round trip to the database
+timed_operations = ("find", "create", "update")
+
+
+def _payload_size(payload: Any) -> int:
+    try:
+        return len(json.dumps(payload, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[rank - 1]
+
+
+class DBMetrics:
+    """Thread safe record of database round trips made during an upload"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.timings: Dict[str, List[float]] = {op: [] for op in timed_operations}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.started = time.perf_counter()
+
+    def record(self, operation: str, seconds: float, sent: int = 0, received: int = 0):
+        with self._lock:
+            self.timings.setdefault(operation, []).append(seconds)
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    @property
+    def round_trips(self) -> int:
+        return sum(len(t) for t in self.timings.values())
+
+    def summary(self, rows: int) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        with self._lock:
+            operations = {}
+            for operation, timings in self.timings.items():
+                if not timings:
+                    continue
+                ordered = sorted(timings)
+                operations[operation] = {
+                    "count": len(ordered),
+                    "total_s": sum(ordered),
+                    "p50_ms": percentile(ordered, 50) * 1000,
+                    "p95_ms": percentile(ordered, 95) * 1000,
+                    "p99_ms": percentile(ordered, 99) * 1000,
+                }
+            return {
+                "rows": rows,
+                "elapsed_s": elapsed,
+                "rows_per_s": rows / elapsed if elapsed > 0 else 0.0,
+                "round_trips": self.round_trips,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "operations": operations,
+            }
+
+    def report(self, rows: int) -> str:
+        summary = self.summary(rows)
+        lines = [
+            f"Uploaded {summary['rows']} rows in {summary['elapsed_s']:.2f}s "
+            f"({summary['rows_per_s']:.1f} rows/s), {summary['round_trips']} round trips, "
+            f"{summary['bytes_sent']} bytes sent, {summary['bytes_received']} bytes received"
+        ]
+        for operation, stats in summary["operations"].items():
+            lines.append(
+                f"  {operation}: {stats['count']} calls, p50 {stats['p50_ms']:.1f}ms, "
+                f"p95 {stats['p95_ms']:.1f}ms, p99 {stats['p99_ms']:.1f}ms"
+            )
+        return "\n".join(lines)
+
+    def write(self, path: Path, rows: int) -> None:
+        """Append the summary as a JSON line to a metrics file"""
+        path = Path(path).expanduser()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a") as f:
+            f.write(json.dumps({"time": time.time(), **self.summary(rows)}) + "\n")
+
+
+class TimedReference:
+    """Wraps an amostra or conftrak reference and times its round trips"""
+
+    def __init__(self, reference, metrics: DBMetrics) -> None:
+        self._reference = reference
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._reference, name)
+        if name not in timed_operations:
+            return attr
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = None
+            try:
+                result = attr(*args, **kwargs)
+                if name == "find":
+                    # find results are lazy, the request is only done once consumed
+                    result = list(result)
+                return result
+            finally:
+                self._metrics.record(
+                    name,
+                    time.perf_counter() - start,
+                    sent=_payload_size([args, kwargs]),
+                    received=_payload_size(result) if result is not None else 0,
+                )
+
+        return timed
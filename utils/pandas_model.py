@@ -5,10 +5,71 @@ from typing import Dict, Tuple
 
 import numpy as np
 import pandas as pd
-from qtpy.QtCore import QAbstractTableModel, QModelIndex, Qt
+from qtpy.QtCore import QAbstractTableModel, QModelIndex, Qt, Signal
 from qtpy.QtGui import QColor
 from qtpy.QtWidgets import QTableView
 
+from utils.puck_lists import PuckListStore
+
+required_columns_list = [
+    "puckname",
+    "position",
+    "samplename",
+    "model",
+    "sequence",
+    "proposalnum",
+]
+_whitespace = re.compile(r"\s+")
+_whitespace_and_dots = re.compile(r"(\.|\s)+")
+_non_digits = re.compile(r"\D")
+_int16 = np.iinfo(np.int16)
+
+
+def _categorical(values: pd.Series, clean: typing.Callable) -> pd.Series:
+    """Categorical column of values after clean(values), clean only runs on
+    the distinct values"""
+    codes, uniques = pd.factorize(values)
+    cleaned = clean(pd.Series(uniques, dtype=object))
+    clean_codes, categories = pd.factorize(cleaned)
+    # Missing values have code -1, which picks the appended -1
+    lookup = np.append(clean_codes, -1)
+    return pd.Series(
+        pd.Categorical.from_codes(
+            lookup[codes], categories=pd.Index(categories, dtype=object)
+        ),
+        index=values.index,
+    )
+
+
+def _compact_integers(values: pd.Series) -> pd.Series:
+    """Nullable integers, Int16 when every value fits"""
+    numbers = pd.to_numeric(values, errors="coerce").astype("Int64")
+    low, high = numbers.min(), numbers.max()
+    if pd.isna(low) or (low >= _int16.min and high <= _int16.max):
+        return numbers.astype("Int16")
+    return numbers
+
+
+def _codes(series: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+    """Category codes and categories of a column, -1 for missing values"""
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype("category")
+    return series.cat.codes.to_numpy(), series.cat.categories
+
+
+def _row_mask(codes: np.ndarray, category_mask) -> np.ndarray:
+    """Per row mask from a mask over the categories, False for missing values"""
+    return np.append(np.asarray(category_mask, dtype=bool), False)[codes]
+
+
+def _strip_whitespace(values: pd.Series) -> pd.Series:
+    return values.astype("string").str.replace(_whitespace, "", regex=True)
+
+
+def _proposal_digits(values: pd.Series) -> pd.Series:
+    numbers = pd.to_numeric(values, errors="coerce").astype("Int64")
+    return numbers.astype("string").str.replace(_non_digits, "", regex=True)
+
 
 class BasePandasModel(QAbstractTableModel):
     """Base model interface Qt view"""
@@ -60,13 +121,72 @@ class BasePandasModel(QAbstractTableModel):
         for i, row in self._dataframe.iterrows():
             yield row
 
+    def toDataFrame(self) -> pd.DataFrame:
+        return self._dataframe
+
     def setData(self, index: QModelIndex, value: typing.Any, role: int = ...) -> bool:
         if role == Qt.ItemDataRole.EditRole:
+            value = self._assignable(index.column(), [value])[0]
             self._dataframe.iloc[index.row(), index.column()] = value
             self.dataChanged.emit(index, index)
             return True
         return False
 
+    def _assignable(self, column: int, values: typing.List) -> typing.Sequence:
+        """Convert values so they can be written into a column, widening the
+        column first when it cannot hold them"""
+        name = self._dataframe.columns[column]
+        series = self._dataframe[name]
+        dtype = series.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            new = [
+                value
+                for value in dict.fromkeys(values)
+                if not pd.isna(value) and value not in dtype.categories
+            ]
+            if new:
+                self._dataframe[name] = series.cat.add_categories(new)
+            return values
+        if isinstance(
+            dtype, pd.api.extensions.ExtensionDtype
+        ) and pd.api.types.is_integer_dtype(dtype):
+            # Compact integer columns such as position take numbers only
+            numbers = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+            numbers = numbers.where(numbers % 1 == 0).astype("Int64")
+            info = np.iinfo(dtype.numpy_dtype)
+            if not numbers.dropna().between(info.min, info.max).all():
+                self._dataframe[name] = series.astype("Int64")
+            return numbers.astype(self._dataframe[name].dtype).array
+        if not pd.api.types.is_string_dtype(dtype):
+            # Pasted text goes into numeric columns too, preprocessing converts it
+            self._dataframe[name] = series.astype(object)
+        return values
+
+    def setBlock(self, row: int, column: int, values) -> bool:
+        """Write a 2D block of values with its top left cell at row, column.
+
+        Each column of the block is written with one assignment and the
+        block is reported with a single dataChanged, instead of one per cell.
+        """
+        block = np.asarray(values, dtype=object)
+        if block.ndim != 2 or block.size == 0:
+            return False
+        rows, columns = block.shape
+        if (
+            row < 0
+            or column < 0
+            or row + rows > self.rowCount()
+            or column + columns > self.columnCount()
+        ):
+            return False
+        for offset in range(columns):
+            values = self._assignable(column + offset, list(block[:, offset]))
+            self._dataframe.iloc[row : row + rows, column + offset] = values
+        self.dataChanged.emit(
+            self.index(row, column), self.index(row + rows - 1, column + columns - 1)
+        )
+        return True
+
     def headerData(
         self, section: int, orientation: Qt.Orientation, role: Qt.ItemDataRole
     ) -> "str | None":
@@ -105,7 +225,13 @@ class BasePandasModel(QAbstractTableModel):
 class PuckPandasModel(BasePandasModel):
     """A model to interface a Qt view with pandas dataframe"""
 
-    def setPuckLists(self, pucklist):
+    # Names already used in the database by samples of the sheet's proposal
+    databaseSampleNames: typing.AbstractSet[str] = frozenset()
+
+    def setDatabaseSampleNames(self, names: typing.AbstractSet[str]) -> None:
+        self.databaseSampleNames = names
+
+    def setPuckLists(self, pucklist: PuckListStore):
         self.puckList = pucklist
 
     def flags(self, index):
@@ -134,7 +260,8 @@ class PuckPandasModel(BasePandasModel):
 
         if not self._checkDuplicateSamples(self._dataframe):
             raise TypeError(
-                "Duplicate sample names found. Added postfix and highlighted in yellow"
+                "Duplicate sample names found, or names already used in the database"
+                " for this proposal. Added postfix and highlighted in yellow"
             )
 
         if not self._checkProposalNumbers(self._dataframe):
@@ -145,45 +272,40 @@ class PuckPandasModel(BasePandasModel):
         self.validData = True
 
     def preprocessData(self) -> None:
+        """Normalize the sheet into the six required columns.
+
+        The canonical frame is built column by column straight from the
+        parsed sheet, other columns are never copied.
+        """
         # Note all column names are lowercase, good for comparison
-        required_columns_list = [
-            "puckname",
-            "position",
-            "samplename",
-            "model",
-            "sequence",
-            "proposalnum",
-        ]
-        required_columns = set(required_columns_list)
-        self._dataframe.columns = self._dataframe.columns.str.lower()
-        columns_absent = None
-
-        # Change current dataframe to only have required columns
-        if not required_columns.issubset(self._dataframe.columns):
-            columns_present = required_columns.intersection(self._dataframe.columns)
-            columns_absent = required_columns - set(self._dataframe.columns)
-            self._dataframe = self._dataframe[list(columns_present)]
-            for col in columns_absent:
-                self._dataframe.loc[:, col] = ""
-
-        # Set data types for various columns. By this point all required columns should be present
-        self._dataframe.loc[:, "position"] = pd.to_numeric(
-            self._dataframe["position"], errors="coerce"
-        ).astype("Int64")
-        self._dataframe.loc[:, "proposalnum"] = pd.to_numeric(
-            self._dataframe["proposalnum"], errors="coerce"
-        ).astype("Int64")
-
-        self._dataframe = self._dataframe.astype({"sequence": "str", "model": "str"})
-        self._dataframe = self._dataframe[required_columns_list]
-
-        # Remove all whitespaces from string columns
-        for col in required_columns:
-            self._dataframe[col] = self._dataframe[col].astype("string")
-            if col != "samplename":
-                self._dataframe[col] = self._dataframe[col].str.replace(r"\s+", "", regex=True)
+        source = {}
+        for i, col in enumerate(self._dataframe.columns):
+            if isinstance(col, str):
+                source.setdefault(col.lower(), i)
+        columns_absent = set(required_columns_list) - set(source)
+
+        columns = {}
+        for col in required_columns_list:
+            if col in source:
+                values = self._dataframe.iloc[:, source[col]]
             else:
-                self._dataframe[col] = self._dataframe[col].str.replace(r"(\.|\s)+", "", regex=True)
+                values = pd.Series("", index=self._dataframe.index, dtype=object)
+            # Few distinct pucks and proposals repeat over many rows, they
+            # are stored as categories and cleaned once per distinct value
+            if col == "position":
+                values = _compact_integers(values)
+            elif col == "proposalnum":
+                values = _categorical(values, _proposal_digits)
+            elif col == "puckname":
+                values = _categorical(values, _strip_whitespace)
+            else:
+                if col in ("sequence", "model"):
+                    values = values.astype("str")
+                values = values.astype("string")
+                pattern = _whitespace_and_dots if col == "samplename" else _whitespace
+                values = values.str.replace(pattern, "", regex=True)
+            columns[col] = values
+        self._dataframe = pd.DataFrame(columns, copy=False)
 
         if columns_absent:
             raise TypeError(
@@ -194,33 +316,58 @@ class PuckPandasModel(BasePandasModel):
 
     def _checkProposalNumbers(self, data: pd.DataFrame) -> bool:
         proposalNumCol = "proposalnum"
-        # Remove all letters from proposal numbers
-        data[proposalNumCol] = data[proposalNumCol].astype("str")
-        data[proposalNumCol] = data[proposalNumCol].str.replace(r"\D", "", regex=True)
+        # Letters were removed from proposal numbers by preprocessData
 
-        # Check if proposal numbers have 6 digits
-        indices = data[proposalNumCol][~data[proposalNumCol].map(len).eq(6)].index
+        # Check if proposal numbers have 6 digits, once per distinct number
+        codes, categories = _codes(data[proposalNumCol])
+        valid = _row_mask(codes, [len(str(p)) == 6 for p in categories])
+        indices = data.index[~valid]
         col_index = data.columns.get_loc(proposalNumCol)
         if len(indices) > 0:
             self._changeCellColors(col_index, indices)
             return False
 
-        if len(data[proposalNumCol].unique()) > 1:
+        if data[proposalNumCol].nunique() > 1:
             return False
 
         return True
 
     def _checkDuplicateSamples(self, data: pd.DataFrame) -> bool:
         column = "samplename"
-        duplicate_rows = data[data[column].duplicated(keep=False)]
-        duplicates = data[data.duplicated(column)]
-        counter = (duplicates.groupby(column).cumcount() + 1).astype(str).str.zfill(3)
-        data.loc[counter.index, column] += "_" + counter
-
-        if len(duplicate_rows):
+        names = data[column]
+        existing = self.databaseSampleNames
+        # Every name in the sheet or the database, renamed samples skip these
+        taken = set(names.dropna()) | set(existing)
+        seen = set()
+        counters: Dict[str, int] = {}
+        renamed: Dict[int, str] = {}
+        for row, name in enumerate(names.tolist()):
+            if pd.isna(name):
+                continue
+            if name not in seen and name not in existing:
+                seen.add(name)
+                continue
+            # Later repeats and names used in the database get the next free
+            # postfix, shortening the name to stay within 25 characters
+            counter = counters.get(name, 0)
+            while True:
+                counter += 1
+                postfix = f"_{counter:03d}"
+                new_name = name[: 25 - len(postfix)] + postfix
+                if new_name not in taken:
+                    break
+            counters[name] = counter
+            taken.add(new_name)
+            renamed[row] = new_name
+
+        if renamed:
+            duplicate_rows = data.index[
+                names.isin([names.iat[row] for row in renamed]).to_numpy()
+            ]
+            data.loc[data.index[list(renamed)], column] = list(renamed.values())
             column_index = data.columns.get_loc("samplename")
             self._changeCellColors(
-                column_index, duplicate_rows.index, color=QColor(Qt.GlobalColor.yellow)
+                column_index, duplicate_rows, color=QColor(Qt.GlobalColor.yellow)
             )
             return False
         return True
@@ -235,14 +382,14 @@ class PuckPandasModel(BasePandasModel):
         return True
 
     def _checkDuplicatePuckPos(self, data: pd.DataFrame) -> bool:
-        duplicate_rows = data[
-            data.duplicated(subset=["puckname", "position"], keep=False)
-        ]
+        codes, _ = _codes(data["puckname"])
+        keys = pd.DataFrame({"puckname": codes, "position": data["position"].array})
+        duplicate_rows = data.index[keys.duplicated(keep=False).to_numpy()]
         if len(duplicate_rows):
             column_index = data.columns.get_loc("puckname")
-            self._changeCellColors(column_index, duplicate_rows.index)
+            self._changeCellColors(column_index, duplicate_rows)
             column_index = data.columns.get_loc("position")
-            self._changeCellColors(column_index, duplicate_rows.index)
+            self._changeCellColors(column_index, duplicate_rows)
             return False
         return True
 
@@ -269,36 +416,41 @@ class PuckPandasModel(BasePandasModel):
 
     def _matchMasterlist(self, data: pd.DataFrame, config) -> bool:
         masterList = self.puckList
-        enteredPucks = set(data["puckname"])
+        codes, categories = _codes(data["puckname"])
+        # Only the pucks in use are checked, each once
+        entered = np.zeros(len(categories), dtype=bool)
+        entered[codes[codes >= 0]] = True
+        enteredPucks = set(categories[entered])
         column_index = data.columns.get_loc("puckname")
 
-        missingPucks = set()
-        allowedPucks = set()
-
+        allowedLists = []
         if not config.get("disable_whitelist", False):
-            allowedPucks.update(set(masterList["whitelist"]))
+            allowedLists.append(masterList["whitelist"])
 
         if not config.get("disable_etchedlist", False):
-            allowedPucks.update(set(masterList["etched"]))
+            allowedLists.append(masterList["etched"])
 
-        if allowedPucks:
-            missingPucks = enteredPucks - allowedPucks
-
-            # data["puckname"].fillna('MISSING', inplace=True)
-            indices = []
-            for puck in missingPucks:
-                if not pd.isnull(puck):
-                    indices.extend(data.index[data["puckname"] == puck].tolist())
+        missingPucks = set()
+        if any(allowedLists):
+            missingPucks = {
+                puck
+                for puck in enteredPucks
+                if not any(puck in allowed for allowed in allowedLists)
+            }
+            indices = data.index[
+                _row_mask(codes, [puck in missingPucks for puck in categories])
+            ]
             self._changeCellColors(
                 column_index, indices, color=QColor(Qt.GlobalColor.yellow)
             )
 
         disallowedPucks = set()
         if not config.get("disable_blacklist", False):
-            disallowedPucks = enteredPucks.intersection(set(masterList["blacklist"]))
-            indices = []
-            for puck in disallowedPucks:
-                indices.extend(data.index[data["puckname"] == puck].tolist())
+            blacklist = masterList["blacklist"]
+            disallowedPucks = {puck for puck in enteredPucks if puck in blacklist}
+            indices = data.index[
+                _row_mask(codes, [puck in disallowedPucks for puck in categories])
+            ]
             self._changeCellColors(column_index, indices)
 
         if missingPucks or disallowedPucks:
@@ -306,7 +458,61 @@ class PuckPandasModel(BasePandasModel):
         return True
 
 
-class DewarPandasModel(BasePandasModel):
+class DewarPandasModel(QAbstractTableModel):
+    """Shipping dewar scan table, one column of puck barcodes per dewar.
+
+    Each column is a list grown by doubling with a set of its barcodes for
+    duplicate checks, so a scan costs the same however many dewars and
+    pucks are already in the table. A DataFrame is only built for export.
+    `dewarScanned` and `puckScanned` report every accepted barcode so the
+    scan can be logged as it happens.
+    """
+
+    # column, dewar name
+    dewarScanned = Signal(int, str)
+    # column, row, puck name
+    puckScanned = Signal(int, int, str)
+
+    def __init__(self, parent=None) -> None:
+        QAbstractTableModel.__init__(self, parent)
+        self._capacity = 16
+        self._row_count = 1
+        # The first column has no dewar until one is scanned into it
+        self._headers: typing.List[typing.Optional[str]] = [None]
+        self._columns: typing.List[typing.List[str]] = [[""] * self._capacity]
+        self._barcodes: typing.List[typing.Set[str]] = [set()]
+        self._first_empty: typing.List[int] = [0]
+        self._dewar_columns: Dict[str, int] = {}
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent == QModelIndex():
+            return self._row_count
+        return 0
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        if parent == QModelIndex():
+            return len(self._headers)
+        return 0
+
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole) -> "str | None":
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole or role == Qt.ItemDataRole.EditRole:
+            return self._columns[index.column()][index.row()]
+        return None
+
+    def headerData(
+        self, section: int, orientation: Qt.Orientation, role: Qt.ItemDataRole
+    ) -> "str | None":
+        if role == Qt.ItemDataRole.DisplayRole:
+            if orientation == Qt.Orientation.Horizontal:
+                return str(self._headers[section])
+
+            if orientation == Qt.Orientation.Vertical:
+                return str(section)
+
+        return None
+
     def flags(self, index):
         return (
             Qt.ItemFlag.ItemIsSelectable
@@ -314,6 +520,68 @@ class DewarPandasModel(BasePandasModel):
             | Qt.ItemFlag.ItemIsEditable
         )
 
+    def toDataFrame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                header: column[: self._row_count]
+                for header, column in zip(self._headers, self._columns)
+            }
+        )
+
+    def dewarContents(self) -> Dict[str, typing.List[str]]:
+        """Puck names by dewar in row order, empty where a row was skipped"""
+        contents = {}
+        for header, column in zip(self._headers, self._columns):
+            if header is None:
+                continue
+            cells = column[: self._row_count]
+            while cells and not cells[-1]:
+                cells.pop()
+            contents[header] = cells
+        return contents
+
+    def scanState(
+        self,
+    ) -> typing.Tuple[Dict[int, str], Dict[int, Dict[int, str]]]:
+        """Headers and filled cells by column, as taken by restore"""
+        headers = {
+            column: header
+            for column, header in enumerate(self._headers)
+            if header is not None
+        }
+        cells = {}
+        for column, values in enumerate(self._columns):
+            rows = {row: puck for row, puck in enumerate(values[: self._row_count]) if puck}
+            if rows:
+                cells[column] = rows
+        return headers, cells
+
+    def restore(
+        self, headers: Dict[int, str], cells: Dict[int, Dict[int, str]]
+    ) -> None:
+        """Rebuild the table from a logged scan"""
+        self.beginResetModel()
+        columns = max([0, *headers, *cells]) + 1
+        filled = [row for rows_by_index in cells.values() for row in rows_by_index]
+        # Scanning into the last row adds a row after it
+        rows = max(filled) + 2 if filled else 1
+        self._capacity = max(16, rows)
+        self._row_count = rows
+        self._headers = [headers.get(column) for column in range(columns)]
+        self._columns = [[""] * self._capacity for _ in range(columns)]
+        self._barcodes = [set() for _ in range(columns)]
+        self._first_empty = [0] * columns
+        self._dewar_columns = {
+            header: column
+            for column, header in enumerate(self._headers)
+            if header is not None
+        }
+        for column, rows_by_index in cells.items():
+            for row, puck in rows_by_index.items():
+                self._columns[column][row] = puck
+                self._barcodes[column].add(puck)
+        self.endResetModel()
+
     def setData(self, index: QModelIndex, value: typing.Any, role: int = ...) -> bool:
         if role == Qt.ItemDataRole.EditRole:
             if str(value).startswith("DEWAR"):
@@ -324,69 +592,71 @@ class DewarPandasModel(BasePandasModel):
             return True
         return False
 
+    def firstEmptyRow(self, column: int) -> "int | None":
+        # Cells are only ever filled, so the first empty row never moves back
+        cells = self._columns[column]
+        row = self._first_empty[column]
+        while row < self._row_count and cells[row]:
+            row += 1
+        self._first_empty[column] = row
+        return row if row < self._row_count else None
+
     def addDewar(self, index: QModelIndex, value):
         tableView: QTableView = self.parent().tableView
-        # If dewar column exists in the dataframe, jump to the first empty
-        if value in self._dataframe.columns:
-            first_empty_row = (
-                self._dataframe[value].eq("").idxmax()
-                if self._dataframe[value].eq("").any()
-                else None
-            )
+        # If dewar column exists in the table, jump to the first empty
+        if value in self._dewar_columns:
+            column = self._dewar_columns[value]
+            first_empty_row = self.firstEmptyRow(column)
             # if first_empty is none create a new row and go there
             if first_empty_row is None:
                 self.addDataToNextRow(index, value)
             else:
-                desired_index = tableView.model().index(
-                    first_empty_row, self._dataframe.columns.get_loc(value)
-                )
-                tableView.setCurrentIndex(desired_index)
+                tableView.setCurrentIndex(self.index(first_empty_row, column))
         else:
             self.addDataToNextColumn(index, value)
 
+    def _appendRow(self):
+        self.beginInsertRows(QModelIndex(), self._row_count, self._row_count)
+        self._row_count += 1
+        if self._row_count > self._capacity:
+            extra = self._capacity
+            for column in self._columns:
+                column.extend([""] * extra)
+            self._capacity += extra
+        self.endInsertRows()
+
     def addDataToNextRow(self, index, value):
         tableView: QTableView = self.parent().tableView
-        if len(self._dataframe.index) == index.row() + 1:
-            self.beginInsertRows(QModelIndex(), index.row() + 1, index.row() + 1)
-            self._dataframe = pd.concat(
-                [
-                    self._dataframe,
-                    pd.Series(
-                        ["" for i in range(len(self._dataframe.columns))],
-                        index=self._dataframe.columns,
-                    )
-                    .to_frame()
-                    .T,
-                ],
-                ignore_index=True,
-            )
-            self.endInsertRows()
-        if (
-            not self._dataframe[self._dataframe.columns[index.column()]]
-            .isin([value])
-            .any()
-        ):
-            self._dataframe.iloc[index.row(), index.column()] = value
-            next_index = self.index(index.row() + 1, index.column())
+        row, column = index.row(), index.column()
+        if self._row_count == row + 1:
+            self._appendRow()
+        if value and value not in self._barcodes[column]:
+            old_value = self._columns[column][row]
+            self._barcodes[column].discard(old_value)
+            self._columns[column][row] = value
+            self._barcodes[column].add(value)
+            self.puckScanned.emit(column, row, value)
+            next_index = self.index(row + 1, column)
             tableView.setCurrentIndex(next_index)
 
     def addDataToNextColumn(self, index, value):
-        if index.row() == 0 and index.column() == 0:
-            if None in self._dataframe.columns:
-                self._dataframe.rename(columns={None: value}, inplace=True)
-                self.layoutChanged.emit()
-            else:
-                self.addDewarColumn(index, value)
+        if index.row() == 0 and index.column() == 0 and self._headers[0] is None:
+            self._headers[0] = value
+            self._dewar_columns[value] = 0
+            self.headerDataChanged.emit(Qt.Orientation.Horizontal, 0, 0)
+            self.dewarScanned.emit(0, value)
         else:
             self.addDewarColumn(index, value)
 
     def addDewarColumn(self, index, value):
         tableView: QTableView = self.parent().tableView
-        # Add a column if we are running out of columns
-        self.beginInsertColumns(QModelIndex(), index.column() + 1, index.column() + 1)
-        self._dataframe[value] = ["" for i in range(len(self._dataframe.index))]
+        column = len(self._headers)
+        self.beginInsertColumns(QModelIndex(), column, column)
+        self._headers.append(value)
+        self._columns.append([""] * self._capacity)
+        self._barcodes.append(set())
+        self._first_empty.append(0)
+        self._dewar_columns[value] = column
         self.endInsertColumns()
-        desired_index = tableView.model().index(
-            0, self._dataframe.columns.get_loc(value)
-        )
-        tableView.setCurrentIndex(desired_index)
+        self.dewarScanned.emit(column, value)
+        tableView.setCurrentIndex(self.index(0, column))
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+labels = ("whitelist", "blacklist", "etched")
+# Sheet names used for each list in Excel master lists
+excel_sheets = {"etched": "etched", "whitelist": "white_list", "blacklist": "black_list"}
+cache_dir = Path("~/.puckimporter/cache").expanduser()
+# Snapshot and workbook writes happen one at a time, off the caller's thread
+_writer = ThreadPoolExecutor(max_workers=1)
+
+
+def _clean(names: Iterable) -> Iterator[str]:
+    # Spreadsheet lists contain blank cells and numbers, keep names as strings
+    for name in names:
+        if name is None or (not isinstance(name, str) and pd.isna(name)):
+            continue
+        name = str(name)
+        if name:
+            yield name
+
+
+class PuckList:
+    """Ordered set of puck names, membership, add and remove are O(1)"""
+
+    def __init__(self, names: Iterable = ()) -> None:
+        self._names: Dict[str, None] = dict.fromkeys(_clean(names))
+        self._rows: Optional[List[str]] = None
+
+    def __contains__(self, name) -> bool:
+        return name in self._names
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __getitem__(self, row: int) -> str:
+        return self.names[row]
+
+    def __bool__(self) -> bool:
+        return bool(self._names)
+
+    @property
+    def names(self) -> List[str]:
+        if self._rows is None:
+            self._rows = list(self._names)
+        return self._rows
+
+    def _changed(self) -> None:
+        self._rows = None
+
+    def add(self, name: str) -> bool:
+        if name in self._names:
+            return False
+        self._names[name] = None
+        self._changed()
+        return True
+
+    def remove(self, name: str) -> bool:
+        return self.removeMany([name]) > 0
+
+    def removeMany(self, names: Iterable[str]) -> int:
+        removed = [name for name in set(names) if name in self._names]
+        for name in removed:
+            del self._names[name]
+        if not removed:
+            return 0
+        self._changed()
+        return len(removed)
+
+    def rename(self, old_name: str, new_name: str) -> bool:
+        """Replace a name keeping its position in the list"""
+        if old_name not in self._names or new_name in self._names:
+            return False
+        self._names = {
+            (new_name if name == old_name else name): None for name in self._names
+        }
+        self._changed()
+        return True
+
+    def matching(self, text: str, within: Optional[List[str]] = None) -> List[str]:
+        """Names containing text, in list order.
+
+        Substring matches cannot use a sorted index, so this scans the names.
+        `within` narrows the scan to an earlier result, which is valid when
+        text extends the text that produced it.
+        """
+        if not text:
+            return self.names
+        candidates = self.names if within is None else within
+        return [name for name in candidates if text in name]
+
+
+class PuckListStore:
+    """The whitelist, blacklist and etched puck lists"""
+
+    def __init__(self, lists: Optional[Dict[str, Iterable]] = None) -> None:
+        self._lists: Dict[str, PuckList] = {}
+        lists = lists or {}
+        for label in labels:
+            self[label] = lists.get(label) or []
+
+    def __getitem__(self, label: str) -> PuckList:
+        return self._lists[label]
+
+    def __setitem__(self, label: str, names: Iterable) -> None:
+        if isinstance(names, PuckList) and self._lists.get(label) is names:
+            return
+        self._lists[label] = PuckList(names)
+
+    def keys(self):
+        return self._lists.keys()
+
+    def toDict(self) -> Dict[str, List[str]]:
+        return {label: list(puck_list) for label, puck_list in self._lists.items()}
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _snapshot_path(path: Path, directory: Path) -> Path:
+    key = hashlib.sha1(str(path.resolve()).encode()).hexdigest()[:16]
+    return directory / f"{path.stem}-{key}.pickle"
+
+
+def _read_excel_lists(path: Path) -> Dict[str, List]:
+    engine = "xlrd" if path.suffix == ".xls" else "openpyxl"
+    reader = pd.ExcelFile(path, engine=engine)
+    lists = {}
+    for label, sheet in excel_sheets.items():
+        df = reader.parse(sheet_name=sheet, header=None)
+        lists[label] = df.iloc[:, 0].to_list() if len(df.columns) > 0 else []
+    return lists
+
+
+def _write_snapshot(path: Path, directory: Path, lists: Dict[str, List], digest: str):
+    try:
+        stat = path.stat()
+        directory.mkdir(parents=True, exist_ok=True)
+        snapshot = _snapshot_path(path, directory)
+        tmp = snapshot.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            pickle.dump(
+                {
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "sha256": digest,
+                    "lists": lists,
+                },
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp, snapshot)
+    except OSError as e:
+        logger.warning(f"Could not write puck list snapshot for {path}: {e}")
+
+
+def load_puck_lists(path: Path, directory: Path = cache_dir) -> PuckListStore:
+    """Load the master puck lists from a json or Excel file.
+
+    Excel files are slow to parse, so the parsed lists are kept in a pickle
+    snapshot keyed by the file's mtime, size and hash. The snapshot is used
+    as is when the mtime and size match, and when only the mtime changed but
+    the contents did not. Otherwise the file is parsed and the snapshot is
+    rewritten in the background.
+    """
+    path = Path(path)
+    if path.suffix == ".json":
+        with path.open("r") as f:
+            return PuckListStore(json.load(f))
+    if path.suffix not in (".xlsx", ".xls"):
+        raise ValueError(f"Unsupported puck list file {path}")
+
+    stat = path.stat()
+    snapshot = None
+    try:
+        with _snapshot_path(path, directory).open("rb") as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable puck list snapshot for {path}: {e}")
+
+    if snapshot is not None:
+        if (snapshot["mtime_ns"], snapshot["size"]) == (stat.st_mtime_ns, stat.st_size):
+            return PuckListStore(snapshot["lists"])
+        digest = _file_hash(path)
+        if snapshot["sha256"] == digest:
+            _writer.submit(_write_snapshot, path, directory, snapshot["lists"], digest)
+            return PuckListStore(snapshot["lists"])
+    else:
+        digest = _file_hash(path)
+
+    lists = _read_excel_lists(path)
+    _writer.submit(_write_snapshot, path, directory, lists, digest)
+    return PuckListStore(lists)
+
+
+def _save(path: Path, directory: Path, lists: Dict[str, List[str]]) -> None:
+    if path.suffix == ".json":
+        with path.open("w") as f:
+            json.dump(lists, f, indent=4)
+        return
+    with pd.ExcelWriter(path, engine="auto", mode="w") as writer:
+        for label, sheet in excel_sheets.items():
+            # Placeholder keeps the sheet when the list is empty
+            names = lists[label] or [""]
+            df = pd.DataFrame({sheet: names})
+            df.to_excel(writer, sheet_name=sheet, index=False, header=False)
+    # The lists are already in memory, no need to parse the new workbook
+    _write_snapshot(path, directory, lists, _file_hash(path))
+
+
+def save_puck_lists(
+    path: Path, puck_lists: PuckListStore, directory: Path = cache_dir
+) -> Future:
+    """Write the lists back to their file and refresh the snapshot in the
+    background, returns the future of the write"""
+    future = _writer.submit(_save, Path(path), directory, puck_lists.toDict())
+
+    def log_failure(f: Future):
+        if f.exception() is not None:
+            logger.error(f"Failed to save puck lists to {path}: {f.exception()}")
+
+    future.add_done_callback(log_failure)
+    return future
+
+
+def wait_for_writes() -> None:
+    """Block until queued snapshot and list writes are done"""
+    _writer.submit(lambda: None).result()
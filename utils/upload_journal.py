@@ -0,0 +1,98 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import pandas as pd
+
+from utils.jsonl_log import JsonLinesLog
+
+journal_dir = Path("~/.puckimporter/journal").expanduser()
+
+
+def sheet_hash(dataframe: pd.DataFrame, *keys) -> str:
+    """Hash the contents of a validated sheet together with any extra keys
+    (beamline, owner...) that change where the sheet would be uploaded"""
+    digest = hashlib.sha256()
+    for key in keys:
+        digest.update(str(key).encode())
+    digest.update(",".join(str(col) for col in dataframe.columns).encode())
+    digest.update(pd.util.hash_pandas_object(dataframe, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def stale_journals(directory: Path = journal_dir, max_age: float = 0) -> List[Path]:
+    """Journals not written to for `max_age` seconds. Their upload was
+    cancelled or its sheet edited since, so it will not resume"""
+    if not directory.exists():
+        return []
+    cutoff = time.time() - max_age
+    return [path for path in directory.glob("*.jsonl") if path.stat().st_mtime < cutoff]
+
+
+def journaled_samples(
+    directory: Path = journal_dir, max_age: Optional[float] = None
+) -> Set[str]:
+    """Uids of the samples recorded by uploads that have not completed,
+    ignoring journals older than `max_age` seconds.
+
+    The journals are only read, never repaired, since an upload may still be
+    writing to them."""
+    uids: Set[str] = set()
+    if not directory.exists():
+        return uids
+    stale = set() if max_age is None else set(stale_journals(directory, max_age))
+    for path in directory.glob("*.jsonl"):
+        if path in stale:
+            continue
+        with path.open("rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if "sample" in entry:
+                    uids.add(entry["sample"])
+    return uids
+
+
+class UploadJournal(JsonLinesLog):
+    """Append-only on-disk log of an upload so an interrupted submit can resume.
+
+    Each line is a JSON entry recording one of:
+      - a sample document created for a row
+      - a puck that has been emptied
+      - a row that has been committed into its puck
+    """
+
+    def __init__(self, key: str, directory: Path = journal_dir) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        self.samples: Dict[int, str] = {}
+        self.emptied: Set[str] = set()
+        self.committed: Set[int] = set()
+        super().__init__(directory / f"{key}.jsonl")
+
+    def _read(self, entry) -> None:
+        if "sample" in entry:
+            self.samples[entry["row"]] = entry["sample"]
+        elif "emptied" in entry:
+            self.emptied.add(entry["emptied"])
+        elif "committed" in entry:
+            self.committed.add(entry["committed"])
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.samples or self.emptied or self.committed)
+
+    def recordSample(self, row: int, sample_uid: str) -> None:
+        self.samples[row] = sample_uid
+        self._append({"row": row, "sample": sample_uid})
+
+    def recordEmptied(self, puck_uid: str) -> None:
+        self.emptied.add(puck_uid)
+        self._append({"emptied": puck_uid})
+
+    def recordCommitted(self, row: int) -> None:
+        self.committed.add(row)
+        self._append({"committed": row})
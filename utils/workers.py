@@ -0,0 +1,649 @@
+import grp
+import logging
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from qtpy.QtCore import QObject, QThread, Signal
+
+from utils.metrics import DBMetrics
+from utils.pandas_model import PuckPandasModel, required_columns_list
+from utils.puck_lists import PuckListStore, load_puck_lists
+from utils.upload_journal import UploadJournal
+
+logger = logging.getLogger(__name__)
+
+
+class UploadWorker(QObject):
+    """Uploads validated puck rows to the database off the GUI thread.
+
+    Rows are processed in batches, sample documents in a batch are created
+    concurrently and each puck touched by the batch is written once.
+    Cancellation is honoured between batches.
+
+    With `diff` the sheet's pucks and their samples are fetched first and
+    only positions whose sample differs get a new sample, pucks whose
+    contents are unchanged are not written at all.
+    """
+
+    progress = Signal(int)
+    finished = Signal(bool)
+    error = Signal(str)
+
+    def __init__(
+        self,
+        rows: List[Dict[str, Any]],
+        db_factory: Callable[[DBMetrics], Any],
+        journal_key: str,
+        batch_size: int = 16,
+        max_workers: int = 4,
+        metrics_path: Optional[str] = None,
+        journal_dir: Optional[Path] = None,
+        diff: bool = False,
+        parent=None,
+    ) -> None:
+        super().__init__(parent)
+        self.rows = rows
+        self.diff = diff
+        self.db_factory = db_factory
+        self.journal_key = journal_key
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.metrics_path = metrics_path
+        self.journal_dir = journal_dir
+        self.metrics = DBMetrics()
+        self._cancel = threading.Event()
+        self._uploaded = 0
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def run(self) -> None:
+        journal = None
+        self.metrics = DBMetrics()
+        self._uploaded = 0
+        try:
+            if self.journal_dir is None:
+                journal = UploadJournal(self.journal_key)
+            else:
+                journal = UploadJournal(self.journal_key, self.journal_dir)
+            if journal.resumed:
+                logger.info(
+                    f"Resuming upload from {journal.path}, "
+                    f"{len(journal.committed)} rows already committed"
+                )
+            canceled = self._upload(self.db_factory(self.metrics), journal)
+            if canceled:
+                journal.close()
+            else:
+                journal.complete()
+            self._reportMetrics()
+            self.finished.emit(canceled)
+        except Exception as e:
+            logger.error(f"Upload failed: {traceback.format_exc()}")
+            if journal is not None:
+                journal.close()
+            self._reportMetrics()
+            self.error.emit(str(e))
+
+    def _reportMetrics(self) -> None:
+        logger.info(self.metrics.report(self._uploaded))
+        if self.metrics_path:
+            try:
+                self.metrics.write(self.metrics_path, self._uploaded)
+            except OSError as e:
+                logger.warning(
+                    f"Could not write upload metrics to {self.metrics_path}: {e}"
+                )
+
+    def _upload(self, db, journal: UploadJournal) -> bool:
+        if self.diff:
+            return self._uploadChanges(db, journal)
+        pending = [
+            (i, row) for i, row in enumerate(self.rows) if i not in journal.committed
+        ]
+        done = len(self.rows) - len(pending)
+        self.progress.emit(done)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            containers = self._prefetchPucks(
+                db, [row["puckname"] for _, row in pending], executor
+            )
+            puck_ids = {name: c["uid"] for name, c in containers.items()}
+            for start in range(0, len(pending), self.batch_size):
+                if self._cancel.is_set():
+                    return True
+                batch = pending[start : start + self.batch_size]
+
+                # Empty each puck before its first samples go in
+                for _, row in batch:
+                    container = containers[row["puckname"]]
+                    if container["uid"] not in journal.emptied:
+                        content = container.get("content", [])
+                        if any(content):
+                            empty = [""] * len(content)
+                            db.updateContainer({"uid": container["uid"], "content": empty})
+                        journal.recordEmptied(container["uid"])
+
+                # Create samples, reusing ones created by an interrupted upload
+                futures = {
+                    executor.submit(
+                        self._createSample, db, row, puck_ids[row["puckname"]]
+                    ): i
+                    for i, row in batch
+                    if i not in journal.samples
+                }
+                errors = []
+                for future in as_completed(futures):
+                    try:
+                        journal.recordSample(futures[future], future.result())
+                    except Exception as e:
+                        errors.append(e)
+                if errors:
+                    raise errors[0]
+
+                positions: Dict[str, Dict[int, str]] = {}
+                for i, row in batch:
+                    positions.setdefault(puck_ids[row["puckname"]], {})[
+                        int(row["position"]) - 1
+                    ] = journal.samples[i]
+                for puck_id, contents in positions.items():
+                    db.setContainerPositions(puck_id, contents)
+                for i, _ in batch:
+                    journal.recordCommitted(i)
+
+                done += len(batch)
+                self._uploaded += len(batch)
+                self.progress.emit(done)
+        return False
+
+    def _uploadChanges(self, db, journal: UploadJournal) -> bool:
+        done = 0
+        self.progress.emit(done)
+        rows_by_puck: Dict[str, List[int]] = {}
+        for i, row in enumerate(self.rows):
+            rows_by_puck.setdefault(row["puckname"], []).append(i)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            containers = self._prefetchPucks(db, list(rows_by_puck), executor)
+            samples = db.getSamplesByID(
+                [uid for c in containers.values() for uid in c["content"] if uid],
+                self.batch_size,
+            )
+            for name, rows in rows_by_puck.items():
+                if self._cancel.is_set():
+                    return True
+                puck_id = containers[name]["uid"]
+                content = list(containers[name]["content"])
+
+                # Positions missing from the sheet end up empty, as after a
+                # full upload which empties the puck first
+                new_content = [""] * len(content)
+                changed = []
+                for i in rows:
+                    position = int(self.rows[i]["position"]) - 1
+                    uid = journal.samples.get(i)
+                    current = content[position]
+                    if uid is None and current:
+                        sample = samples.get(current, {})
+                        fields = self._sampleFields(self.rows[i])
+                        if sample.get("container") == puck_id and all(
+                            sample.get(key) == value for key, value in fields.items()
+                        ):
+                            uid = current
+                    if uid is None:
+                        changed.append(i)
+                    else:
+                        new_content[position] = uid
+
+                futures = {
+                    executor.submit(
+                        self._createSample, db, self.rows[i], puck_id
+                    ): i
+                    for i in changed
+                }
+                errors = []
+                for future in as_completed(futures):
+                    try:
+                        journal.recordSample(futures[future], future.result())
+                    except Exception as e:
+                        errors.append(e)
+                if errors:
+                    raise errors[0]
+                for i in changed:
+                    position = int(self.rows[i]["position"]) - 1
+                    new_content[position] = journal.samples[i]
+
+                if new_content != content:
+                    db.updateContainer({"uid": puck_id, "content": new_content})
+                for i in rows:
+                    if i not in journal.committed:
+                        journal.recordCommitted(i)
+
+                done += len(rows)
+                self._uploaded += len(changed)
+                self.progress.emit(done)
+        return False
+
+    def _prefetchPucks(
+        self, db, names: List[str], executor: ThreadPoolExecutor
+    ) -> Dict[str, Dict[str, Any]]:
+        """Containers of every named puck. Existing pucks are found with one
+        query per batch of names and missing ones are created concurrently"""
+        containers = db.getContainersByName(names, "16_pin_puck", self.batch_size)
+        futures = {
+            executor.submit(db.createContainer, name, 16, "16_pin_puck"): name
+            for name in dict.fromkeys(names)
+            if name not in containers
+        }
+        for future in as_completed(futures):
+            uid = future.result()
+            containers[futures[future]] = {"uid": uid, "content": [""] * 16}
+        return containers
+
+    @staticmethod
+    def _sampleFields(row: Dict[str, Any]) -> Dict[str, Any]:
+        model = row["model"]
+        seq = row["sequence"]
+        return {
+            "name": str(row["samplename"]),
+            "model": None if pd.isna(model) else str(model),
+            "sequence": None if pd.isna(seq) else str(seq),
+            "proposalID": row["proposalnum"],
+        }
+
+    @staticmethod
+    def _createSample(db, row: Dict[str, Any], puck_id: str) -> str:
+        fields = UploadWorker._sampleFields(row)
+        return db.createSample(
+            fields.pop("name"), "pin", container=puck_id, **fields
+        )
+
+
+class DewarSubmitWorker(QObject):
+    """Writes scanned shipping dewars and their pucks to the database.
+
+    Existing pucks and dewars are looked up with one query per batch of
+    names, missing pucks are created concurrently and each dewar is then
+    created or updated with a single write, skipped if it is unchanged.
+    Pucks are matched by name whoever owns them, a user's puck is never
+    duplicated under the submitting account. `progress` counts the dewars
+    written, `finished` carries whether the submit was cancelled and the
+    names of the pucks owned by someone else.
+    """
+
+    progress = Signal(int)
+    finished = Signal(bool, object)
+    error = Signal(str)
+
+    def __init__(
+        self,
+        dewars: Dict[str, List[str]],
+        db_factory: Callable[[DBMetrics], Any],
+        batch_size: int = 200,
+        max_workers: int = 4,
+        parent=None,
+    ) -> None:
+        super().__init__(parent)
+        self.dewars = dewars
+        self.db_factory = db_factory
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.metrics = DBMetrics()
+        self._cancel = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def run(self) -> None:
+        self.metrics = DBMetrics()
+        try:
+            canceled, foreign = self._submit(self.db_factory(self.metrics))
+            logger.info(self.metrics.report(len(self.dewars)))
+            self.finished.emit(canceled, foreign)
+        except Exception as e:
+            logger.error(f"Dewar submit failed: {traceback.format_exc()}")
+            self.error.emit(str(e))
+
+    def _submit(self, db) -> Tuple[bool, List[str]]:
+        self.progress.emit(0)
+        puck_names = [name for pucks in self.dewars.values() for name in pucks if name]
+        # Staff scan dewars holding users' pucks, the beamline resolves a
+        # barcode to the newest puck of that name whoever owns it
+        pucks = db.getContainersByName(
+            puck_names, "16_pin_puck", self.batch_size, match_owner=False
+        )
+        puck_ids = {name: container["uid"] for name, container in pucks.items()}
+        foreign = sorted(
+            name for name, container in pucks.items() if container.get("owner") != db.owner
+        )
+        if foreign:
+            logger.info(f"Pucks owned by other users, linked as they are: {foreign}")
+        missing = [name for name in dict.fromkeys(puck_names) if name not in puck_ids]
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {
+                    executor.submit(db.createContainer, name, 16, "16_pin_puck"): name
+                    for name in missing
+                }
+                for future in as_completed(futures):
+                    puck_ids[futures[future]] = future.result()
+
+        existing = db.getContainersByName(
+            list(self.dewars), "shipping_dewar", self.batch_size
+        )
+        for done, (name, dewar_pucks) in enumerate(self.dewars.items(), start=1):
+            if self._cancel.is_set():
+                return True, foreign
+            content = [puck_ids[puck] if puck else "" for puck in dewar_pucks]
+            dewar = existing.get(name)
+            if dewar is None:
+                db.createContainer(name, None, "shipping_dewar", content=content)
+            elif dewar.get("content") != content:
+                db.updateContainer({"uid": dewar["uid"], "content": content})
+            self.progress.emit(done)
+        return False, foreign
+
+
+class ExcelExportWorker(QObject):
+    """Writes a table to an Excel file on a background thread, `finished`
+    carries the file path and the error message, empty on success"""
+
+    finished = Signal(object, str)
+
+    def __init__(
+        self, dataframe: pd.DataFrame, filepath: Path, engine: str, parent=None
+    ) -> None:
+        super().__init__(parent)
+        self.dataframe = dataframe
+        self.filepath = filepath
+        self.engine = engine
+
+    def start(self) -> None:
+        threading.Thread(target=self.run, name="ExcelExportWorker", daemon=True).start()
+
+    def run(self) -> None:
+        try:
+            self.dataframe.to_excel(self.filepath, engine=self.engine, index=False)
+        except Exception as e:
+            logger.error(f"Exception: {traceback.format_exc()}")
+            self.finished.emit(self.filepath, str(e))
+            return
+        self.finished.emit(self.filepath, "")
+
+
+class ValidationWorker(QObject):
+    """Preprocesses and validates a puck sheet off the GUI thread.
+
+    The sheet is validated in a fresh PuckPandasModel which is moved to
+    `target_thread` and handed back through `finished` together with the
+    validation error message, empty if the sheet is valid. A cancelled
+    worker emits `finished` with no model. With a `db_factory` the sample
+    names already used by the sheet's proposal are fetched first, so
+    duplicates of them are renamed too.
+    """
+
+    finished = Signal(object, str)
+
+    def __init__(
+        self,
+        dataframe: Optional[pd.DataFrame],
+        pucklists,
+        config,
+        target_thread: QThread,
+        db_factory: Optional[Callable[[], Any]] = None,
+        parent=None,
+    ) -> None:
+        super().__init__(parent)
+        self.dataframe = dataframe
+        self.pucklists = pucklists
+        self.config = config
+        self.target_thread = target_thread
+        self.db_factory = db_factory
+        self._cancel = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    @property
+    def canceled(self) -> bool:
+        return self._cancel.is_set()
+
+    def _load(self) -> Optional[pd.DataFrame]:
+        return self.dataframe
+
+    def run(self) -> None:
+        try:
+            data = self._load()
+        except Exception as e:
+            logger.error(f"Exception: {traceback.format_exc()}")
+            self.finished.emit(None, str(e))
+            return
+        if data is None or self.canceled:
+            self.finished.emit(None, "")
+            return
+
+        model = PuckPandasModel(data)
+        model.setPuckLists(self.pucklists)
+        message = ""
+        try:
+            model.preprocessData()
+            if self.db_factory is not None:
+                model.setDatabaseSampleNames(self._databaseSampleNames(model))
+            model.validateData(self.config)
+        except Exception as e:
+            logger.error(f"{type(e).__name__}: {traceback.format_exc()}")
+            message = str(e)
+        if self.canceled:
+            self.finished.emit(None, "")
+            return
+        model.moveToThread(self.target_thread)
+        self.finished.emit(model, message)
+
+    def _databaseSampleNames(self, model: PuckPandasModel) -> Set[str]:
+        data = model._dataframe
+        proposals = data["proposalnum"].dropna().unique()
+        if len(proposals) != 1:
+            # Validation rejects the sheet anyway
+            return set()
+        db = self.db_factory()
+        pucks = db.getContainersByName(data["puckname"].dropna().unique(), "16_pin_puck")
+        # Samples in the sheet's own pucks are replaced by the upload
+        return db.getSampleNames(
+            proposals[0], [puck["uid"] for puck in pucks.values()]
+        )
+
+
+class ImportWorker(ValidationWorker):
+    """Parses the sheets of a workbook concurrently and validates the first
+    one with the required puck columns"""
+
+    def __init__(
+        self,
+        filename: str,
+        engine: Optional[str],
+        pucklists,
+        config,
+        target_thread: QThread,
+        max_workers: int = 4,
+        parent=None,
+    ) -> None:
+        super().__init__(None, pucklists, config, target_thread, parent=parent)
+        self.filename = filename
+        self.engine = engine
+        self.max_workers = max(1, max_workers)
+
+    def _load(self) -> Optional[pd.DataFrame]:
+        excel_file = pd.ExcelFile(self.filename, engine=self.engine)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self._parseSheet, excel_file, sheet_name)
+                for sheet_name in excel_file.sheet_names
+            ]
+            # Sheets are checked in workbook order, the first valid one wins
+            data = None
+            for future in futures:
+                if self.canceled:
+                    break
+                data = future.result()
+                if data is not None:
+                    break
+            for future in futures:
+                future.cancel()
+        return data
+
+    def _parseSheet(self, excel_file: pd.ExcelFile, sheet_name) -> Optional[pd.DataFrame]:
+        if self.canceled:
+            return None
+        data = excel_file.parse(sheet_name)
+        if data.empty:
+            return None
+        # Check if any row besides header row contains "puckname"
+        rows = (data.applymap(lambda x: str(x).lower() == "puckname")).any(axis=1)
+
+        required_columns = set(required_columns_list)
+        header_correct = required_columns.issubset(
+            (col.strip().lower() for col in data.columns if isinstance(col, str))
+        )
+        if not rows.all() and not header_correct:
+            import_offset = data.loc[rows].first_valid_index()
+            if isinstance(import_offset, (int, np.integer)):
+                data = excel_file.parse(
+                    sheet_name=sheet_name, skiprows=import_offset + 1
+                )
+        data.rename(
+            columns={
+                col: col.strip().lower() for col in data.columns if isinstance(col, str)
+            },
+            inplace=True,
+        )
+        # Check headers again after offset
+        header_correct = required_columns.issubset(
+            (col.strip().lower() for col in data.columns if isinstance(col, str))
+        )
+        if header_correct:
+            return data
+        return None
+
+
+class PuckListWatcher(QObject):
+    """Polls the master list file and reloads it when its mtime or size change.
+
+    Loading happens on the polling thread and the new PuckListStore is
+    handed over through `reloaded` so the GUI thread can swap it in.
+    """
+
+    reloaded = Signal(object)
+
+    def __init__(self, path: Path, interval: float = 5.0, parent=None) -> None:
+        super().__init__(parent)
+        self.path = Path(path)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stat = self._statFile()
+
+    def _statFile(self):
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def start(self) -> None:
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(
+                target=self._poll, name="PuckListWatcher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.interval):
+            stat = self._statFile()
+            if stat is None or stat == self._stat:
+                continue
+            try:
+                store = load_puck_lists(self.path)
+            except Exception as e:
+                # The file may be mid-write, try again on the next poll
+                logger.warning(f"Could not reload puck lists from {self.path}: {e}")
+                continue
+            self._stat = stat
+            logger.info(f"Reloaded puck lists from {self.path}")
+            self.reloaded.emit(store)
+
+
+class StartupWorker(QObject):
+    """Loads what the main window needs after it is already on screen.
+
+    The master puck lists, the admin group check and an optional database
+    warmup run concurrently on a background thread; each reports through
+    its own signal as soon as it is done. The warmup connection is thrown
+    away, it only preloads the client modules and checks the host.
+    """
+
+    lists_loaded = Signal(object, str)
+    admin_resolved = Signal(bool)
+    warmed_up = Signal(str)
+
+    def __init__(
+        self,
+        list_path: Path,
+        admin_group: Optional[str],
+        db_factory: Optional[Callable[[], Any]] = None,
+        parent=None,
+    ) -> None:
+        super().__init__(parent)
+        self.list_path = Path(list_path)
+        self.admin_group = admin_group
+        self.db_factory = db_factory
+
+    def start(self) -> None:
+        threading.Thread(target=self.run, name="StartupWorker", daemon=True).start()
+
+    def run(self) -> None:
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            executor.submit(self._loadLists)
+            executor.submit(self._resolveAdmin)
+            if self.db_factory is not None:
+                executor.submit(self._warmup)
+
+    def _loadLists(self) -> None:
+        if not self.list_path.exists():
+            self.lists_loaded.emit(
+                PuckListStore(),
+                f"Puck list file {self.list_path} not found. White list and black list are empty",
+            )
+            return
+        try:
+            self.lists_loaded.emit(load_puck_lists(self.list_path), "")
+        except Exception as e:
+            logger.error(f"Exception: {traceback.format_exc()}")
+            self.lists_loaded.emit(
+                PuckListStore(), f"Could not read puck lists from {self.list_path}: {e}"
+            )
+
+    def _resolveAdmin(self) -> None:
+        # A single lookup of the admin group instead of resolving every group
+        # the user belongs to, which is slow with network group databases
+        try:
+            is_admin = grp.getgrnam(self.admin_group).gr_gid in os.getgroups()
+        except (KeyError, TypeError):
+            is_admin = False
+        self.admin_resolved.emit(is_admin)
+
+    def _warmup(self) -> None:
+        try:
+            self.db_factory().warmup()
+            self.warmed_up.emit("")
+        except Exception as e:
+            logger.warning(f"Database warmup failed: {e}")
+            self.warmed_up.emit(str(e))